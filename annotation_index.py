@@ -0,0 +1,149 @@
+import bisect
+
+# Filter keys understood by AnnotationIndex
+UNLABELED = ("unlabeled", None)
+UNDESCRIBED = ("undescribed", None)
+NEAR_DUPLICATES = ("near_duplicates", None)
+
+
+def label_filter(label):
+    return ("label", label)
+
+
+class AnnotationIndex:
+    """
+    Inverted indexes over image positions (indices into DataManager.image_files):
+    label -> sorted positions, plus sorted positions of unlabeled images and of
+    images without a description. Kept up to date on each annotation change, so
+    finding the next match is a binary search instead of a scan.
+    """
+    def __init__(self):
+        self.by_label = {}
+        self.unlabeled = []
+        self.undescribed = []
+        self.near_duplicates = []  # Set by DataManager.set_duplicate_groups
+
+    def rebuild(self, image_files, annotations):
+        """Index every image; needed whenever positions shift (images added/removed)."""
+        position_of = {name: position for position, name in enumerate(image_files)}
+        if hasattr(annotations, "names_with_label"):
+            self._rebuild_from_queries(image_files, annotations, position_of)
+            return
+        by_label = {}
+        labeled = set()
+        described = set()
+        for name, annotation in annotations.items():
+            position = position_of.get(name)
+            if position is None:
+                continue  # Annotation for an image that is not in the folder
+            for label in set(annotation.get("labels", [])):
+                by_label.setdefault(label, []).append(position)
+                labeled.add(position)
+            if annotation.get("description"):
+                described.add(position)
+        for positions in by_label.values():
+            positions.sort()
+        self.by_label = by_label
+        self.unlabeled = [p for p in range(len(image_files)) if p not in labeled]
+        self.undescribed = [p for p in range(len(image_files)) if p not in described]
+
+    def _rebuild_from_queries(self, image_files, annotations, position_of):
+        """rebuild() for a store that answers label/status queries itself (SqliteAnnotations)."""
+        def positions_of(names):
+            return sorted(p for p in map(position_of.get, names) if p is not None)
+
+        by_label = {}
+        labeled = set()
+        for label in annotations.label_names():
+            positions = positions_of(annotations.names_with_label(label))
+            if positions:
+                by_label[label] = positions
+                labeled.update(positions)
+        undescribed = set(positions_of(annotations.unannotated_names()))
+        known = set(undescribed)
+        for name, has_description in annotations.annotated_names():
+            position = position_of.get(name)
+            if position is not None:
+                known.add(position)
+                if not has_description:
+                    undescribed.add(position)
+        self.by_label = by_label
+        self.unlabeled = [p for p in range(len(image_files)) if p not in labeled]
+        # Images without a row yet (new since the last session) have no description either
+        self.undescribed = [p for p in range(len(image_files)) if p in undescribed or p not in known]
+
+    def extend(self, image_files, start, annotations):
+        """Index the images appended at positions `start` onwards (nothing before them moved)."""
+        for position in range(start, len(image_files)):
+            annotation = annotations.get(image_files[position], {})
+            labels = set(annotation.get("labels", []))
+            for label in labels:
+                self.by_label.setdefault(label, []).append(position)
+            if not labels:
+                self.unlabeled.append(position)
+            if not annotation.get("description"):
+                self.undescribed.append(position)
+
+    def update(self, position, old_annotation, new_annotation):
+        """Move one image between index entries after its annotation changed."""
+        old_labels = set(old_annotation.get("labels", []))
+        new_labels = set(new_annotation.get("labels", []))
+        for label in old_labels - new_labels:
+            self._discard(self.by_label.get(label, []), position)
+        for label in new_labels - old_labels:
+            self._add(self.by_label.setdefault(label, []), position)
+        if new_labels:
+            self._discard(self.unlabeled, position)
+        else:
+            self._add(self.unlabeled, position)
+        if new_annotation.get("description"):
+            self._discard(self.undescribed, position)
+        else:
+            self._add(self.undescribed, position)
+
+    def positions(self, filter_key):
+        """Sorted positions matching `filter_key` (UNLABELED, UNDESCRIBED, NEAR_DUPLICATES or label_filter(...))."""
+        kind, label = filter_key
+        if kind == "label":
+            return self.by_label.get(label, [])
+        if kind == "unlabeled":
+            return self.unlabeled
+        if kind == "undescribed":
+            return self.undescribed
+        if kind == "near_duplicates":
+            return self.near_duplicates
+        raise ValueError(f"Unknown filter '{kind}'.")
+
+    def find_next(self, filter_key, position, direction=1, wrap=True):
+        """Position of the next match after (direction=1) or before (-1) `position`, or None."""
+        positions = self.positions(filter_key)
+        if not positions:
+            return None
+        if direction > 0:
+            i = bisect.bisect_right(positions, position)
+            if i < len(positions):
+                return positions[i]
+            return positions[0] if wrap else None
+        i = bisect.bisect_left(positions, position)
+        if i > 0:
+            return positions[i - 1]
+        return positions[-1] if wrap else None
+
+    def rank(self, filter_key, position):
+        """(1-based rank of `position` among the matches or None, number of matches)."""
+        positions = self.positions(filter_key)
+        i = bisect.bisect_left(positions, position)
+        found = i < len(positions) and positions[i] == position
+        return (i + 1 if found else None), len(positions)
+
+    @staticmethod
+    def _add(positions, position):
+        i = bisect.bisect_left(positions, position)
+        if i == len(positions) or positions[i] != position:
+            positions.insert(i, position)
+
+    @staticmethod
+    def _discard(positions, position):
+        i = bisect.bisect_left(positions, position)
+        if i < len(positions) and positions[i] == position:
+            del positions[i]
@@ -0,0 +1,369 @@
+import json
+import os
+import threading
+
+from compact_annotations import CompactAnnotations, LabelTable
+from profiling import profiler
+
+
+def atomic_write_json(path, data):
+    """
+    Write `data` as JSON to a temp file next to `path`, fsync it and rename it
+    over `path`, so a crash leaves either the old or the new file, never a torn one.
+    """
+    _atomic_write(path, lambda f: json.dump(data, f, indent=2, ensure_ascii=False))
+
+
+def atomic_write_annotations(path, annotations, last_index):
+    """
+    Like atomic_write_json(path, {"last_index": ..., "annotations": ...}), with
+    the same layout, but writes one entry at a time so a compact `annotations`
+    mapping is never expanded into dicts all at once.
+    """
+    def write(f):
+        f.write('{\n  "last_index": %d,\n  "annotations": {' % last_index)
+        separator = "\n    "
+        encoded = {}  # Entries without a description repeat a lot: encode each label list once
+        for image_name, annotation in annotations.items():
+            # Only plain label-only entries share an encoding
+            plain = not annotation.get("description") and annotation.keys() <= {"description", "labels"}
+            key = tuple(annotation.get("labels", ())) if plain else None
+            entry = encoded.get(key) if key is not None else None
+            if entry is None:
+                entry = json.dumps(annotation, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+                if key is not None and len(encoded) < 4096:
+                    encoded[key] = entry
+            f.write(f"{separator}{json.dumps(image_name, ensure_ascii=False)}: {entry}")
+            separator = ",\n    "
+        f.write("\n  }\n}" if separator != "\n    " else "}\n}")
+    _atomic_write(path, write)
+
+
+def _atomic_write(path, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        # Make the rename itself durable (POSIX only)
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class AnnotationJournal:
+    """
+    Append-only log of annotation changes stored next to annotations.json.
+    Each line is one JSON record, so a change costs one small append instead
+    of rewriting the whole annotations file. The journal is replayed on load
+    and cleared once its records have been compacted into annotations.json.
+
+    Compaction runs concurrently with appends: rotate() moves the current
+    records aside (to `<journal>.1`) when the snapshot is taken, and
+    discard_rotated() drops them once the snapshot is safely on disk.
+    """
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.rotated_path = journal_path + ".1"
+        self.record_count = 0
+        self._file = None
+
+    def append(self, image_name, annotation, last_index, changed_at=None):
+        if self._file is None:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        record = {"image": image_name, "annotation": annotation, "last_index": last_index}
+        if changed_at is not None:
+            record["time"] = changed_at
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.record_count += 1
+
+    def append_many(self, records):
+        """Append several (image_name, annotation, last_index, changed_at) records with a single flush."""
+        if self._file is None:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        lines = []
+        for image_name, annotation, last_index, changed_at in records:
+            record = {"image": image_name, "annotation": annotation, "last_index": last_index}
+            if changed_at is not None:
+                record["time"] = changed_at
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.write("".join(lines))
+        self._file.flush()
+        self.record_count += len(lines)
+
+    def replay(self):
+        """Yield (image_name, annotation, last_index) for every complete record, oldest first."""
+        for record in self.replay_records():
+            yield record["image"], record["annotation"], record.get("last_index", 0)
+
+    def replay_records(self):
+        """Yield every complete record as a dict, oldest first."""
+        self.record_count = 0
+        for path in (self.rotated_path, self.journal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-append leaves a partial last line; skip it
+                        continue
+                    self.record_count += 1
+                    yield record
+
+    def rotate(self):
+        """Move the current records aside; new appends start a fresh journal."""
+        self.close()
+        if os.path.exists(self.journal_path):
+            if os.path.exists(self.rotated_path):
+                # A previous compaction failed: keep its records in front of ours
+                with open(self.journal_path, 'r', encoding='utf-8') as src, \
+                        open(self.rotated_path, 'a', encoding='utf-8') as dst:
+                    dst.write(src.read())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.rotated_path)
+        self.record_count = 0
+
+    def discard_rotated(self):
+        """Drop the rotated records (after they have been written to annotations.json)."""
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def clear(self):
+        """Drop all records."""
+        self.rotate()
+        self.discard_rotated()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class AsyncSaveWriter:
+    """
+    Runs `save` on a background thread when changes are pending. Requests made
+    within `interval` seconds of each other are coalesced into a single save.
+    """
+    def __init__(self, save, interval=2.0):
+        self.save = save
+        self.interval = interval
+        self.last_error = None
+        self._dirty = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def request(self):
+        """Mark changes as pending; they will be saved within `interval` seconds."""
+        with self._cond:
+            self._dirty = True
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="annotation-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty or self._closed)
+                if self._closed:
+                    return
+                # Let the rest of the burst arrive before writing
+                if self._cond.wait_for(lambda: self._closed, timeout=self.interval):
+                    return  # The owner does the final save on close
+                self._dirty = False
+            try:
+                self.save()
+                self.last_error = None
+            except Exception as e:
+                # Keep the changes pending (retried after `interval`); the journal still holds them.
+                # Anything escaping here would end the thread and silently stop all later saves.
+                self.last_error = e
+                with self._cond:
+                    self._dirty = True
+
+    def close(self):
+        """Stop the background thread, waiting for a save in progress to finish."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class AnnotationStore:
+    """
+    Base class for annotation storage backends.
+    `annotations` maps image name -> {"description": str, "labels": [str]}.
+    """
+    def __init__(self, data_folder):
+        self.data_folder = data_folder
+        self.annotations = {}
+        self.last_index = 0
+
+    @property
+    def save_error(self):
+        """The error of the last failed background save, or None (also once a later save succeeded)."""
+        return None
+
+    def load(self, image_files, mtimes=None):
+        """Load annotations and the last viewed index; a new dataset gets empty entries."""
+        self._initialize_dataset(image_files, mtimes)
+        self.last_index = 0
+
+    def _initialize_dataset(self, image_files, mtimes=None):
+        # Empty entries cost one slot each, not a dict and a list
+        self.annotations = CompactAnnotations(labels=self._label_table())
+        self.annotations.add_empty(image_files)
+
+    def _label_table(self):
+        return LabelTable()
+
+    def add_images(self, image_names, mtimes=None):
+        """Give newly found images an empty entry."""
+        for image in image_names:
+            if image not in self.annotations:
+                self.annotations[image] = {
+                    "description": "",
+                    "labels": [],
+                }
+
+    def remove_images(self, image_names):
+        """Drop the entries of vanished images, unless they hold annotations worth keeping."""
+        for image in image_names:
+            annotation = self.annotations.get(image)
+            if annotation is not None and not annotation.get("labels") and not annotation.get("description"):
+                del self.annotations[image]
+
+    def put(self, image_name, annotation, last_index):
+        """Store one image's annotation."""
+        self.annotations[image_name] = annotation
+        self.last_index = last_index
+
+    def put_many(self, items, last_index):
+        """Store several (image_name, annotation) pairs as one change."""
+        for image_name, annotation in items:
+            self.annotations[image_name] = annotation
+        self.last_index = last_index
+
+    def save(self, last_index=None):
+        """Persist everything."""
+        if last_index is not None:
+            self.last_index = last_index
+
+    def close(self, last_index=None, save=True):
+        if save:
+            self.save(last_index)
+
+
+class JsonAnnotationStore(AnnotationStore):
+    """
+    annotations.json plus an append-only journal; full rewrites happen on a
+    background writer, at most once every `save_interval` seconds.
+    `labels` (the configured labels, in `label_groups` order) seeds the label
+    table, so entries decode their labels in that order.
+    """
+    def __init__(self, data_folder, save_interval=2.0, labels=()):
+        super().__init__(data_folder)
+        self.labels = list(labels)
+        self.meta_file = os.path.join(data_folder, "annotations.json")
+        self.journal = AnnotationJournal(os.path.join(data_folder, "annotations.journal"))
+        self.writer = AsyncSaveWriter(self.save, save_interval)
+        self._lock = threading.Lock()  # Guards annotations + journal against the writer's snapshot
+        self._save_lock = threading.Lock()  # One full write at a time
+
+    @property
+    def save_error(self):
+        return self.writer.last_error
+
+    def _label_table(self):
+        return LabelTable(self.labels)
+
+    def load(self, image_files, mtimes=None):
+        if not os.path.exists(self.meta_file):
+            self._initialize_dataset(image_files, mtimes)
+            self.last_index = 0
+        else:
+            annotations, self.last_index = read_annotations_file(self.meta_file)
+            self.annotations = CompactAnnotations(annotations, self._label_table())
+
+        # Apply changes made since the last compaction
+        for image_name, annotation, last_index in self.journal.replay():
+            self.annotations[image_name] = annotation
+            self.last_index = last_index
+
+    def add_images(self, image_names, mtimes=None):
+        with self._lock:
+            super().add_images(image_names, mtimes)
+        self.writer.request()
+
+    def remove_images(self, image_names):
+        with self._lock:
+            super().remove_images(image_names)
+        self.writer.request()
+
+    def put(self, image_name, annotation, last_index):
+        with self._lock:
+            super().put(image_name, annotation, last_index)
+            self.journal.append(image_name, annotation, last_index)
+        self.writer.request()
+
+    def put_many(self, items, last_index):
+        """One journal write and one background rewrite for the whole batch."""
+        items = list(items)
+        with self._lock:
+            super().put_many(items, last_index)
+            self.journal.append_many((name, annotation, last_index, None) for name, annotation in items)
+        self.writer.request()
+
+    @profiler.timed("save_annotations")
+    def save(self, last_index=None):
+        """Write annotations and the last viewed index back to disk, compacting the journal."""
+        with self._save_lock:
+            with self._lock:
+                if last_index is not None:
+                    self.last_index = last_index
+                snapshot = self.annotations.copy()
+                last_index = self.last_index
+                # Changes made from here on go to a fresh journal
+                self.journal.rotate()
+            atomic_write_annotations(self.meta_file, snapshot, last_index)
+            self.journal.discard_rotated()
+
+    def close(self, last_index=None, save=True):
+        """Stop the background writer and write everything to disk."""
+        self.writer.close()
+        if save:
+            self.save(last_index)
+
+
+def read_annotations_file(meta_file):
+    """
+    Read annotations.json in either format.
+    :return: (annotations dict, last_index)
+    """
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and 'annotations' in data:
+        # New format: { "last_index": <int>, "annotations": { ... } }
+        return data.get('annotations', {}), data.get('last_index', 0)
+    # Legacy format: just a dict of annotations
+    return data, 0
+
+
+def open_annotation_store(storage, data_folder, **kwargs):
+    """Create the storage backend named `storage` ("json" or "sqlite")."""
+    if storage == "json":
+        return JsonAnnotationStore(data_folder, **kwargs)
+    if storage == "sqlite":
+        from sqlite_store import SqliteAnnotationStore
+        return SqliteAnnotationStore(data_folder, **kwargs)
+    raise ValueError(f"Unknown annotation storage '{storage}'.")
@@ -0,0 +1,294 @@
+"""
+Synthetic datasets and repeatable benchmarks.
+
+    python benchmark.py generate OUT_DIR [--images 200] [--annotations 0] [--legacy]
+    python benchmark.py run [--folder DIR] [--images 100] [--sizes 10000,100000,1000000] [--out results.json]
+
+`generate` writes N images of mixed sizes and formats (with distinct mtimes,
+so their order is stable) and optionally an annotations.json with any number
+of entries, in the current or the legacy format.
+
+`run` times DataManager.load_data (with a cold and a warm folder manifest),
+annotation saves and loads at each size in --sizes, rendering the view at
+several zoom levels (through a withdrawn Tk root when a display is
+available, otherwise the resampling alone) and navigation throughput in
+images per second. Results are printed (or written to --out) as JSON so runs
+can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import PIL
+from PIL import Image
+
+from annotation_store import JsonAnnotationStore, read_annotations_file
+from compact_annotations import CompactAnnotations
+from data_manager import DataManager
+from folder_scan import MANIFEST_NAME
+from image_cache import ImagePyramid, LRUCache
+from image_loader import ImagePrefetcher, decode_image
+
+IMAGE_SIZES = [(640, 480), (1920, 1080), (1080, 1920), (4000, 3000)]
+IMAGE_FORMATS = [("jpg", "JPEG"), ("png", "PNG"), ("jpg", "JPEG"), ("bmp", "BMP"), ("tif", "TIFF")]
+DEFAULT_LABELS = ["blurry", "dark", "overexposed", "person", "vehicle", "animal", "indoor", "outdoor"]
+
+
+# --- synthetic data ---
+
+def generate_images(folder, count, seed=0):
+    """Write `count` noisy images of mixed sizes and formats; returns their names oldest first."""
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    start = time.time() - count
+    names = []
+    for i in range(count):
+        width, height = IMAGE_SIZES[i % len(IMAGE_SIZES)]
+        extension, image_format = IMAGE_FORMATS[i % len(IMAGE_FORMATS)]
+        # Noise over a colour tint compresses roughly like a photo
+        noise = Image.effect_noise((width // 4, height // 4), 40).resize((width, height), Image.BILINEAR)
+        tint = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        image = Image.blend(tint, Image.merge("RGB", (noise, noise, noise)), 0.5)
+        name = f"img_{i:07d}.{extension}"
+        path = os.path.join(folder, name)
+        image.save(path, image_format)
+        os.utime(path, (start + i, start + i))
+        names.append(name)
+    return names
+
+
+def generate_annotations(count, labels=DEFAULT_LABELS, seed=0, names=None):
+    """Annotations for `count` images (or for `names`), about half of them labelled."""
+    rng = random.Random(seed)
+    names = names if names is not None else [f"img_{i:07d}.jpg" for i in range(count)]
+    annotations = {}
+    for name in names:
+        if rng.random() < 0.5:
+            chosen = rng.sample(labels, rng.randint(1, 3))
+            description = f"synthetic description {rng.randrange(1000)}, " if rng.random() < 0.3 else ""
+        else:
+            chosen, description = [], ""
+        annotations[name] = {"description": description, "labels": chosen}
+    return annotations
+
+
+def write_annotations(path, annotations, legacy=False, last_index=0):
+    data = annotations if legacy else {"last_index": last_index, "annotations": annotations}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+# --- measurement ---
+
+def _time(func, repeat=3):
+    """Run `func` `repeat` times; returns timings in seconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return {"min_s": round(min(durations), 6), "median_s": round(statistics.median(durations), 6), "runs": repeat}
+
+
+def bench_load_data(folder, repeat=3):
+    manifest = os.path.join(folder, MANIFEST_NAME)
+
+    def cold():
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        DataManager(folder).close(save=False)
+
+    def warm():
+        DataManager(folder).close(save=False)
+
+    result = {"images": len(DataManager(folder, use_manifest=False).image_files)}
+    result["cold_manifest"] = _time(cold, repeat)
+    warm()  # Make sure the manifest exists
+    result["warm_manifest"] = _time(warm, repeat)
+    return result
+
+
+def bench_save(sizes, repeat=3):
+    """Full annotations.json rewrite and parse for each number of entries."""
+    results = {}
+    for size in sizes:
+        annotations = generate_annotations(size)
+        with tempfile.TemporaryDirectory() as folder:
+            store = JsonAnnotationStore(folder)
+            # Same representation as a loaded store, so the save takes the same path
+            store.annotations = CompactAnnotations(annotations)
+            entry = {"save": _time(lambda: store.save(0), repeat)}
+            entry["file_mb"] = round(os.path.getsize(store.meta_file) / 1e6, 2)
+            entry["load"] = _time(lambda: read_annotations_file(store.meta_file), repeat)
+            store.close(save=False)
+        results[str(size)] = entry
+    return results
+
+
+class _Viewer:
+    """
+    The rendering state of AnnotationUI without the window, so its own
+    _compute_viewport runs unchanged. Draws through a withdrawn Tk root if
+    one can be created.
+    """
+    def __init__(self, canvas_size, use_tk=True):
+        from main import AnnotationUI
+        self.compute_viewport = AnnotationUI._compute_viewport
+        self.canvas_size = canvas_size
+        self.state = SimpleNamespace(image_pyramid=None, zoom_factor=1.0, image_x=0, image_y=0)
+        self.root = self.canvas = self.image_id = None
+        if use_tk:
+            try:
+                import tkinter as tk
+                self.root = tk.Tk()
+                self.root.withdraw()
+                self.canvas = tk.Canvas(self.root, width=canvas_size[0], height=canvas_size[1])
+            except Exception:  # No display
+                self.root = None
+
+    def show(self, pyramid, zoom_mult, interactive=False):
+        """Same steps as AnnotationUI._show_image at `zoom_mult` times the fit zoom."""
+        width, height = self.canvas_size
+        self.state.image_pyramid = pyramid
+        self.state.zoom_factor = min(width / pyramid.size[0], height / pyramid.size[1]) * zoom_mult
+        viewport = self.compute_viewport(self.state, width, height)
+        if viewport is None:
+            return
+        box, size, position = viewport
+        if interactive:
+            image = pyramid.render(box, size, Image.BILINEAR, store=False, allow_load=False)
+        else:
+            image = pyramid.render(box, size, Image.LANCZOS)
+        if self.canvas is not None:
+            from PIL import ImageTk
+            self.tk_image = ImageTk.PhotoImage(image)
+            if self.image_id is None:
+                self.image_id = self.canvas.create_image(position[0], position[1], anchor="nw", image=self.tk_image)
+            else:
+                self.canvas.itemconfigure(self.image_id, image=self.tk_image)
+            self.root.update_idletasks()
+
+    def close(self):
+        if self.root is not None:
+            self.root.destroy()
+
+
+def bench_render(viewer, image_path, zoom_mults=(1.0, 2.0, 5.0), repeat=5):
+    """Render the view of one image at each zoom, with an empty render cache (first view) and per frame while interacting."""
+    image, full_size = decode_image(image_path)
+    results = {"image": os.path.basename(image_path), "size": list(full_size), "tk": viewer.canvas is not None}
+    for mult in zoom_mults:
+        def first_view():
+            viewer.show(ImagePyramid(image, LRUCache(256 * 1024 * 1024), full_size), mult)
+        pyramid = ImagePyramid(image, LRUCache(256 * 1024 * 1024), full_size)
+        viewer.show(pyramid, mult)  # Build the pyramid levels once
+        # Interactive frames are never cached
+        interactive = lambda: viewer.show(pyramid, mult, interactive=True)
+        results[f"zoom_{mult:g}x"] = {
+            "first_view": _time(first_view, repeat),
+            "interactive_frame": _time(interactive, repeat),
+        }
+    return results
+
+
+def bench_navigation(viewer, paths, prefetch_radius=2):
+    """Step through `paths` like load_image does; returns images per second."""
+    prefetcher = ImagePrefetcher()
+    cache = LRUCache(256 * 1024 * 1024)
+    start = time.perf_counter()
+    for i, path in enumerate(paths):
+        decoded = prefetcher.get(path, viewer.canvas_size)
+        viewer.show(ImagePyramid(decoded.image, cache, decoded.full_size), 1.0)
+        if prefetch_radius:
+            prefetcher.prefetch(paths[i + 1:i + 1 + prefetch_radius], viewer.canvas_size)
+    elapsed = time.perf_counter() - start
+    prefetcher.shutdown()
+    return {"images": len(paths), "prefetch_radius": prefetch_radius,
+            "seconds": round(elapsed, 3), "images_per_s": round(len(paths) / elapsed, 1)}
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.folder
+        if not folder:
+            folder = os.path.join(tmp, "images")
+            generate_images(folder, args.images, args.seed)
+        canvas_size = tuple(args.canvas)
+        results = {
+            "meta": {
+                "python": platform.python_version(),
+                "pillow": PIL.__version__,
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "canvas": list(canvas_size),
+            },
+            "load_data": bench_load_data(folder, args.repeat),
+            "save_annotations": bench_save(args.sizes, args.repeat),
+        }
+        paths = [os.path.join(folder, name) for name in DataManager(folder, use_manifest=False).image_files]
+        viewer = _Viewer(canvas_size, use_tk=not args.no_tk)
+        try:
+            largest = max(paths, key=os.path.getsize)
+            results["render"] = bench_render(viewer, largest, repeat=args.repeat)
+            results["navigation"] = [
+                bench_navigation(viewer, paths, prefetch_radius=0),
+                bench_navigation(viewer, paths, prefetch_radius=2),
+            ]
+        finally:
+            viewer.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ImageLabeller benchmarks and synthetic datasets.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    gen = subparsers.add_parser("generate", help="Write a synthetic image folder")
+    gen.add_argument("out_dir")
+    gen.add_argument("--images", type=int, default=200)
+    gen.add_argument("--annotations", type=int, default=0,
+                     help="Also write annotations.json with this many entries (defaults to one per image)")
+    gen.add_argument("--legacy", action="store_true", help="Write annotations.json in the legacy format")
+    gen.add_argument("--seed", type=int, default=0)
+
+    bench = subparsers.add_parser("run", help="Run the benchmarks and print JSON results")
+    bench.add_argument("--folder", help="Image folder to use (default: a generated one)")
+    bench.add_argument("--images", type=int, default=100, help="Size of the generated folder")
+    bench.add_argument("--sizes", type=lambda v: [int(n) for n in v.split(",")], default=[10000, 100000, 1000000],
+                       help="Comma-separated annotation counts for the save benchmark")
+    bench.add_argument("--canvas", type=int, nargs=2, default=[800, 600], metavar=("W", "H"))
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--no-tk", action="store_true", help="Do not draw through Tk even if a display is available")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--out", help="Write the results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        names = generate_images(args.out_dir, args.images, args.seed)
+        if args.annotations or args.legacy:
+            count = args.annotations or len(names)
+            extra = [f"img_{i:07d}.jpg" for i in range(len(names), count)]
+            annotations = generate_annotations(count, seed=args.seed, names=(names + extra)[:count])
+            write_annotations(os.path.join(args.out_dir, "annotations.json"), annotations, args.legacy)
+        print(f"Generated {len(names)} images in {args.out_dir}")
+        return 0
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+from collections.abc import MutableMapping
+
+
+class LabelTable:
+    """
+    Interns label strings as bit positions; append-only, so it can be shared
+    between copies. Seed it with the configured labels so the bit layout (and
+    the order labels decode in) follows `label_groups`, not the file.
+    """
+    def __init__(self, labels=()):
+        self.names = []
+        self.ids = {}
+        for label in labels:
+            self.bit(label)
+
+    def bit(self, label):
+        bit = self.ids.get(label)
+        if bit is None:
+            bit = self.ids[label] = len(self.names)
+            self.names.append(label)
+        return bit
+
+    def encode(self, labels):
+        mask = 0
+        for label in labels:
+            mask |= 1 << self.bit(label)
+        return mask
+
+    def decode(self, mask):
+        labels = []
+        bit = 0
+        while mask:
+            if mask & 1:
+                labels.append(self.names[bit])
+            mask >>= 1
+            bit += 1
+        return labels
+
+
+class CompactAnnotations(MutableMapping):
+    """
+    image name -> {"description": str, "labels": [str]}, stored compactly:
+    each image is one slot holding an int bitmask of interned labels (0 for
+    no labels, which Python shares), and descriptions are kept only for the
+    images that have one. The dicts handed out are built on access, so
+    changing one does not change the store; assign it back instead.
+
+    Images with an empty annotation still have a slot, so `name in annotations`
+    keeps telling "known, but not annotated yet" apart from "no entry".
+    Keys other than description and labels (e.g. added by other tools) are
+    kept per image in a side dict, for the few entries that have them. So is
+    the label list of an entry whose labels are not in table order (or repeat
+    one), so every entry reads back exactly as it was stored.
+    """
+    def __init__(self, items=(), labels=None):
+        self.labels = labels if labels is not None else LabelTable()
+        self._masks = {}  # image name -> label bitmask
+        self._descriptions = {}  # image name -> non-empty description
+        self._extras = {}  # image name -> {other key: value}
+        self._orders = {}  # image name -> labels, when not in table order
+        if hasattr(items, "items"):
+            items = items.items()
+        for image_name, annotation in items:
+            self[image_name] = annotation
+
+    def __getitem__(self, image_name):
+        mask = self._masks[image_name]
+        order = self._orders.get(image_name)
+        if order is not None:
+            labels = list(order)
+        else:
+            labels = self.labels.decode(mask) if mask else []
+        annotation = {
+            "description": self._descriptions.get(image_name, ""),
+            "labels": labels,
+        }
+        extras = self._extras.get(image_name)
+        if extras:
+            annotation.update(extras)
+        return annotation
+
+    def __setitem__(self, image_name, annotation):
+        labels = annotation.get("labels", ())
+        mask = self._masks[image_name] = self.labels.encode(labels)
+        if mask and list(labels) != self.labels.decode(mask):
+            self._orders[image_name] = tuple(labels)
+        else:
+            self._orders.pop(image_name, None)
+        description = annotation.get("description", "")
+        if description:
+            self._descriptions[image_name] = description
+        else:
+            self._descriptions.pop(image_name, None)
+        extras = {key: value for key, value in annotation.items() if key not in ("description", "labels")}
+        if extras:
+            self._extras[image_name] = extras
+        else:
+            self._extras.pop(image_name, None)
+
+    def __delitem__(self, image_name):
+        del self._masks[image_name]
+        self._descriptions.pop(image_name, None)
+        self._extras.pop(image_name, None)
+        self._orders.pop(image_name, None)
+
+    def __contains__(self, image_name):
+        return image_name in self._masks
+
+    def __iter__(self):
+        return iter(self._masks)
+
+    def __len__(self):
+        return len(self._masks)
+
+    def add_empty(self, image_names):
+        """Give images without an entry an empty one (no per-image objects are created)."""
+        for image_name in image_names:
+            self._masks.setdefault(image_name, 0)
+
+    def copy(self):
+        """Snapshot sharing the (append-only) label table; cheap compared to materialising every entry."""
+        snapshot = CompactAnnotations(labels=self.labels)
+        snapshot._masks = self._masks.copy()
+        snapshot._descriptions = self._descriptions.copy()
+        snapshot._extras = self._extras.copy()  # Values are replaced, never mutated, so shallow is enough
+        snapshot._orders = self._orders.copy()
+        return snapshot
@@ -1,61 +1,252 @@
+import bisect
 import json
 import os
 
+from annotation_index import AnnotationIndex
+from annotation_store import atomic_write_json, open_annotation_store
+from folder_scan import MANIFEST_NAME, refresh_folder_mtime, scan_images
+from profiling import profiler
+
+# What the last session ended on, so the next one can show it before the folder is loaded
+SESSION_NAME = ".imagelabeller_session.json"
+
+
+def read_resume_hint(data_folder):
+    """
+    The image and annotation the last session ended on, if annotations.json
+    is exactly as that session left it (same size and mtime, no journal) and
+    the image still exists; otherwise None.
+    :return: {"image": name, "index": position, "annotation": {...}} or None
+    """
+    try:
+        with open(os.path.join(data_folder, SESSION_NAME), 'r', encoding='utf-8') as f:
+            hint = json.load(f)
+        stat = os.stat(os.path.join(data_folder, "annotations.json"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(hint, dict) or [stat.st_size, stat.st_mtime_ns] != hint.get("annotations_stat"):
+        return None
+    if os.path.exists(os.path.join(data_folder, "annotations.journal")):
+        return None  # Changes after the last full write; the hint may be stale
+    image = hint.get("image")
+    if not isinstance(image, str) or not os.path.isfile(os.path.join(data_folder, image)):
+        return None
+    index = hint.get("index")
+    return {"image": image, "index": index if isinstance(index, int) else 0, "annotation": hint.get("annotation", {})}
+
 class DataManager:
     """Image data management class"""
-    def __init__(self, data_folder):
+    def __init__(self, data_folder, storage="json", recursive=False, use_manifest=True, shard=None,
+                 update_manifest=True, **store_options):
         self.data_folder = data_folder
         self.meta_file = os.path.join(data_folder, "annotations.json")
+        # Multi-annotator mode (a shards.ShardSpec): only this annotator's part of
+        # the folder is shown, and only its own shard file is written
+        self.shard = shard
+        if shard is not None:
+            if storage != "json":
+                raise ValueError("Sharded sessions need the json storage.")
+            from shards import ShardedAnnotationStore
+            self.store = ShardedAnnotationStore(data_folder, shard, **store_options)
+        else:
+            # Where annotations live: "json" (annotations.json + journal) or "sqlite"
+            self.store = open_annotation_store(storage, data_folder, **store_options)
+        self.recursive = recursive
+        # Remembers directory listings so restarts only re-list changed directories
+        self.manifest_file = os.path.join(data_folder, MANIFEST_NAME) if use_manifest else None
+        self.update_manifest = update_manifest  # False: read it only (report-only tools)
         self.image_files = []
+        self.file_stats = {}  # image name -> (size, mtime)
         self.annotations = {}
+        # label / status -> sorted positions in image_files, for filtered navigation
+        self.index = AnnotationIndex()
+        # Near-duplicate groups (lists of image names, see duplicates.py) and position -> its group
+        self.duplicate_groups = []
+        self._group_at = {}
         self.current_index = 0
         self.load_data()
 
+    @profiler.timed("load_data")
     def load_data(self):
         """Load images and annotations from the data folder."""
-        all_files = [f for f in os.listdir(self.data_folder)
-                     if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif'))]
-        self.image_files = sorted(all_files, key=lambda x: os.path.getmtime(os.path.join(self.data_folder, x)))
+        self.image_files, self.file_stats = scan_images(
+            self.data_folder, self.recursive, self.manifest_file, self.update_manifest
+        )
+        if self.shard is not None:
+            # file_stats keeps every file so the folder watcher knows about all of them
+            self.image_files = self.shard.select(self.image_files)
+        mtimes = {name: mtime for name, (size, mtime) in self.file_stats.items()}
 
-        if not os.path.exists(self.meta_file):
-            self._initialize_dataset()
-        else:
-            with open(self.meta_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            if isinstance(data, dict) and 'annotations' in data:
-                # New format: { "last_index": <int>, "annotations": { ... } }
-                self.annotations = data.get('annotations', {})
-                self.current_index = data.get('last_index', 0)
+        self.store.load(self.image_files, mtimes)
+        self.annotations = self.store.annotations
+        self.current_index = self.store.last_index
+        self.index.rebuild(self.image_files, self.annotations)
+
+    def apply_folder_changes(self, added, removed):
+        """
+        Merge images that appeared in ({name: (size, mtime)}) or vanished from
+        the data folder, keeping the modification-time order and the current image.
+        :return: True if the current image itself was removed.
+        """
+        current_name = self.image_files[self.current_index] if self.image_files else None
+        old_count = len(self.image_files)
+        removed = set(removed) & self.file_stats.keys()
+        if removed:
+            self.image_files = [name for name in self.image_files if name not in removed]
+            for name in removed:
+                del self.file_stats[name]
+            self.store.remove_images(removed)
+
+        sort_key = lambda name: (self.file_stats[name][1], name)
+        new_names = [name for name in added if name not in self.file_stats]
+        for name in new_names:
+            self.file_stats[name] = tuple(added[name])
+        if self.shard is not None:
+            new_names = [name for name in new_names if self.shard.owns(name)]
+        shifted = bool(removed)
+        for name in sorted(new_names, key=sort_key):
+            # New captures are usually the newest files, so this is mostly an append
+            if not self.image_files or sort_key(self.image_files[-1]) <= sort_key(name):
+                self.image_files.append(name)
             else:
-                # Legacy format: just a dict of annotations
-                self.annotations = data
-                self.current_index = 0
+                bisect.insort(self.image_files, name, key=sort_key)
+                shifted = True
+        if new_names:
+            self.store.add_images(new_names, {name: self.file_stats[name][1] for name in new_names})
+        if shifted:
+            # Positions moved: index from scratch
+            self.index.rebuild(self.image_files, self.annotations)
+            self._index_duplicate_groups()
+        elif new_names:
+            # Pure append: existing positions (and duplicate groups) are unchanged
+            self.index.extend(self.image_files, old_count, self.annotations)
 
-    def _initialize_dataset(self):
-        self.annotations = {}
-        for image in self.image_files:
-            self.annotations[image] = {
-                "description": "",
-                "labels": [],
-            }
+        if current_name is not None and current_name not in removed:
+            if self.current_index >= len(self.image_files) or self.image_files[self.current_index] != current_name:
+                self.current_index = self.image_files.index(current_name)
+            return False
+        self.current_index = max(0, min(self.current_index, len(self.image_files) - 1))
+        return current_name is not None
+
+    def set_duplicate_groups(self, groups):
+        """Use `groups` (lists of image names) for the near-duplicate filter and group_of()."""
+        self.duplicate_groups = groups
+        self._index_duplicate_groups()
+
+    def _index_duplicate_groups(self):
+        position_of = {name: position for position, name in enumerate(self.image_files)}
+        self._group_at = {}
+        for group in self.duplicate_groups:
+            positions = [position_of[name] for name in group if name in position_of]
+            if len(positions) > 1:
+                for position in positions:
+                    self._group_at[position] = positions
+        self.index.near_duplicates = sorted(self._group_at)
+
+    def group_of(self, index):
+        """Positions of the near-duplicate group containing `index` (in order), or []."""
+        return self._group_at.get(index, [])
+
+    def get_current_name(self):
+        return self.image_files[self.current_index] if self.image_files else None
 
     def get_current_image(self):
-        return os.path.join(self.data_folder, self.image_files[self.current_index])
+        return self.get_image_path(self.current_index)
+
+    def get_image_path(self, index):
+        return os.path.join(self.data_folder, self.image_files[index])
 
     def get_current_annotation(self):
         image_name = self.image_files[self.current_index]
         return self.annotations.get(image_name, {})
     
     def set_current_annotation(self, annotation):
-        image_name = self.image_files[self.current_index]
-        self.annotations[image_name] = annotation
-        self.save_annotations()
+        self.set_annotation(self.current_index, annotation)
+
+    def set_annotation(self, position, annotation):
+        """Store the annotation of the image at `position` (the last viewed index stays current_index)."""
+        image_name = self.image_files[position]
+        old_annotation = self.annotations.get(image_name, {})
+        self.store.put(image_name, annotation, self.current_index)
+        self.index.update(position, old_annotation, annotation)
+
+    def select(self, start=None, end=None, filter_key=None, names=None):
+        """
+        Positions for a bulk operation, sorted: the index range [start, end)
+        (default: all images), narrowed to the matches of `filter_key` and/or
+        to the images in `names`.
+        """
+        start = 0 if start is None else max(start, 0)
+        end = len(self.image_files) if end is None else min(end, len(self.image_files))
+        if filter_key is not None:
+            matches = self.index.positions(filter_key)
+            positions = matches[bisect.bisect_left(matches, start):bisect.bisect_left(matches, end)]
+        else:
+            positions = range(start, end)
+        if names is not None:
+            wanted = set(names)
+            positions = [position for position in positions if self.image_files[position] in wanted]
+        return list(positions)
+
+    def bulk_update(self, positions, set_labels=None, add_labels=(), remove_labels=(),
+                    set_description=None, append_description=None):
+        """
+        Change the annotations of many images at once, written as one batch.
+        Labels are replaced by `set_labels` (if given), then `add_labels` are
+        added and `remove_labels` removed; the description is replaced by
+        `set_description` (if given), then `append_description` is appended.
+        :return: number of images whose annotation changed
+        """
+        changes = []
+        for position in list(positions):  # May be an index list that the updates below modify
+            image_name = self.image_files[position]
+            old_annotation = self.annotations.get(image_name, {})
+            # Other per-entry keys are kept as they are
+            current = {"description": "", "labels": [], **old_annotation}
+            labels = list(current["labels"]) if set_labels is None else list(set_labels)
+            labels += [label for label in add_labels if label not in labels]
+            labels = [label for label in labels if label not in remove_labels]
+            description = current["description"] if set_description is None else set_description
+            if append_description:
+                description += append_description
+            annotation = {**current, "description": description, "labels": labels}
+            if annotation != current:
+                changes.append((position, image_name, old_annotation, annotation))
+        if changes:
+            self.store.put_many([(name, annotation) for _, name, _, annotation in changes], self.current_index)
+            for position, _, old_annotation, annotation in changes:
+                self.index.update(position, old_annotation, annotation)
+        return len(changes)
+
+    def find_next(self, filter_key, direction=1):
+        """Index of the next image (wrapping around) matching `filter_key`, or None."""
+        return self.index.find_next(filter_key, self.current_index, direction)
 
     def save_annotations(self):
         """Write annotations and the last viewed index back to disk."""
-        data = {
-            'last_index': self.current_index,
-            'annotations': self.annotations
-        }
-        with open(self.meta_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+        self.store.save(self.current_index)
+
+    def close(self, save=True):
+        """Flush pending writes (unless save=False) and release the storage backend."""
+        self.store.close(self.current_index, save)
+        # Only a plain annotations.json can be checked for staleness by the next session
+        if save and getattr(self.store, "meta_file", None) == self.meta_file:
+            self._write_resume_hint()
+        if self.manifest_file and self.update_manifest:
+            # Our own writes above changed the folder's mtime, not its images
+            refresh_folder_mtime(self.manifest_file, self.data_folder, self.recursive)
+
+    def _write_resume_hint(self):
+        image_name = self.get_current_name()
+        if image_name is None:
+            return
+        try:
+            stat = os.stat(self.meta_file)
+            atomic_write_json(os.path.join(self.data_folder, SESSION_NAME), {
+                "image": image_name,
+                "index": self.current_index,
+                "annotation": self.annotations.get(image_name, {}),
+                "annotations_stat": [stat.st_size, stat.st_mtime_ns],
+            })
+        except OSError:
+            pass  # Only costs the fast start next time
@@ -0,0 +1,218 @@
+"""
+Near-duplicate grouping (burst shots) with perceptual hashes.
+
+    python duplicates.py [--config data_config.json] [--folder PATH] [--threshold 6] [--window 20] [--workers N] [--out groups.json]
+
+Each image gets a 64-bit DCT hash computed from a reduced decode, on a
+process pool. Hashes are kept in `.imagelabeller_hashes.json` in the image
+folder, keyed by file size and mtime, so re-runs only hash new or changed
+files. Images whose hashes differ in at most `threshold` bits and that lie
+within `window` positions of each other (in the folder's time order) are
+grouped.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+
+from annotation_store import atomic_write_json
+from image_loader import decode_image
+
+HASH_CACHE_NAME = ".imagelabeller_hashes.json"
+HASH_CACHE_VERSION = 1
+HASH_SIZE = 32  # Images are shrunk to HASH_SIZE x HASH_SIZE before the DCT
+_CHUNK = 64  # Images per worker task
+_SAVE_EVERY = 2048  # Hashes between cache writes, so an interrupted run keeps most of its work
+
+_dct_matrix = None
+
+
+def _low_dct():
+    """The 8 lowest-frequency rows of the HASH_SIZE-point DCT-II (unnormalised; only signs matter)."""
+    global _dct_matrix
+    if _dct_matrix is None:
+        n = np.arange(HASH_SIZE)
+        k = np.arange(8)[:, None]
+        _dct_matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * HASH_SIZE)).astype(np.float32)
+    return _dct_matrix
+
+
+def image_hash(path):
+    """64-bit perceptual hash: signs of the 8x8 lowest DCT coefficients against their median."""
+    # Draft/reduced decoding: no need to decode more than the hash looks at
+    image, _ = decode_image(path, (HASH_SIZE, HASH_SIZE))
+    pixels = np.asarray(image.convert("L").resize((HASH_SIZE, HASH_SIZE), Image.LANCZOS), dtype=np.float32)
+    dct = _low_dct()
+    low = (dct @ pixels @ dct.T).ravel()
+    bits = low > np.median(low[1:])  # The DC term would skew the median
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _hash_chunk(paths):
+    """Worker task: [(name, path)] -> [(name, hash or None)]."""
+    results = []
+    for name, path in paths:
+        try:
+            results.append((name, image_hash(path)))
+        except (OSError, ValueError, SyntaxError):
+            results.append((name, None))  # Unreadable; retried once the file changes
+    return results
+
+
+def load_hash_cache(data_folder):
+    """{name: [size, mtime, hex hash or None]} from the sidecar file (empty if missing or outdated)."""
+    try:
+        with open(os.path.join(data_folder, HASH_CACHE_NAME), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != HASH_CACHE_VERSION or data.get("hash_size") != HASH_SIZE:
+        return {}
+    return data.get("entries", {})
+
+
+def save_hash_cache(data_folder, entries):
+    atomic_write_json(os.path.join(data_folder, HASH_CACHE_NAME),
+                      {"version": HASH_CACHE_VERSION, "hash_size": HASH_SIZE, "entries": entries})
+
+
+def compute_hashes(data_folder, image_files, file_stats, max_workers=None, progress=None, cancel=None):
+    """
+    Hashes of `image_files` (name -> int, or None if unreadable), hashing only
+    files whose size or mtime differ from the cache, across `max_workers`
+    processes (default: all cores).
+    :param progress: called as progress(done, total) with the number of images hashed so far
+    :param cancel: threading.Event; when set, stops after the chunks in progress (images not hashed yet are left out)
+    """
+    cache = load_hash_cache(data_folder)
+    entries = {}
+    stale = []
+    for name in image_files:
+        size, mtime = file_stats[name]
+        cached = cache.get(name)
+        if cached is not None and cached[0] == size and cached[1] == mtime:
+            entries[name] = cached
+        else:
+            stale.append(name)
+
+    if stale:
+        total = len(stale)
+        done = since_save = 0
+        if progress:
+            progress(0, total)
+        chunks = [[(name, os.path.join(data_folder, name)) for name in stale[i:i + _CHUNK]]
+                  for i in range(0, total, _CHUNK)]
+        # spawn: the UI process has threads (Tk, prefetcher), which fork does not copy safely
+        pool = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            for future in as_completed([pool.submit(_hash_chunk, chunk) for chunk in chunks]):
+                if cancel is not None and cancel.is_set():
+                    break
+                results = future.result()
+                for name, value in results:
+                    size, mtime = file_stats[name]
+                    entries[name] = [size, mtime, None if value is None else f"{value:016x}"]
+                done += len(results)
+                since_save += len(results)
+                if progress:
+                    progress(done, total)
+                if since_save >= _SAVE_EVERY:
+                    save_hash_cache(data_folder, entries)
+                    since_save = 0
+        finally:
+            pool.shutdown(cancel_futures=True)
+            # Keep what was hashed, also when interrupted
+            save_hash_cache(data_folder, entries)
+    elif set(cache) != set(entries):
+        save_hash_cache(data_folder, entries)  # Drop images that are gone
+
+    return {name: None if entry[2] is None else int(entry[2], 16) for name, entry in entries.items()}
+
+
+def _popcount(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def find_clusters(hashes, threshold=6, window=20):
+    """
+    Group positions whose hashes differ in at most `threshold` bits and are at
+    most `window` positions apart; groups chain (a~b and b~c puts a, b, c together).
+    :param hashes: one hash (or None) per position
+    :return: groups of two or more positions, each sorted, ordered by first position
+    """
+    count = len(hashes)
+    valid = np.array([h is not None for h in hashes], dtype=bool)
+    values = np.array([h or 0 for h in hashes], dtype=np.uint64)
+    parent = list(range(count))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Compare every image with the next `window` images, one offset at a time over the whole array
+    for offset in range(1, min(window, count - 1) + 1):
+        close = _popcount(values[:-offset] ^ values[offset:]) <= threshold
+        close &= valid[:-offset] & valid[offset:]
+        for i in np.flatnonzero(close).tolist():
+            a, b = root(i), root(i + offset)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for i in range(count):
+        groups.setdefault(root(i), []).append(i)
+    return [group for _, group in sorted(groups.items()) if len(group) > 1]
+
+
+def find_duplicates(data_folder, image_files, file_stats, threshold=6, window=20, max_workers=None,
+                    progress=None, cancel=None):
+    """Hash (as needed) and group `image_files`; returns groups of image names in folder order."""
+    hashes = compute_hashes(data_folder, image_files, file_stats, max_workers, progress, cancel)
+    groups = find_clusters([hashes.get(name) for name in image_files], threshold, window)
+    return [[image_files[i] for i in group] for group in groups]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Group near-duplicate images (burst shots) by perceptual hash.")
+    parser.add_argument("--config", default="data_config.json", help="DataConfig file")
+    parser.add_argument("--folder", help="Image folder (defaults to folder_path from the config)")
+    parser.add_argument("--threshold", type=int, default=6, help="Maximum differing hash bits (of 64)")
+    parser.add_argument("--window", type=int, default=20, help="Only compare images this many positions apart")
+    parser.add_argument("--workers", type=int, help="Hashing processes (default: all cores)")
+    parser.add_argument("--out", help="Write the groups as JSON to this file")
+    args = parser.parse_args(argv)
+
+    from config import DataConfig
+    from folder_scan import MANIFEST_NAME, scan_images
+    data_config = DataConfig(args.config) if args.folder is None else None
+    folder = args.folder or data_config.get("folder_path", "")
+    recursive = data_config.get("recursive", False) if data_config else False
+    image_files, file_stats = scan_images(folder, recursive, os.path.join(folder, MANIFEST_NAME))
+
+    def progress(done, total):
+        print(f"\rHashing {done}/{total}", end="" if done < total else "\n", file=sys.stderr, flush=True)
+
+    groups = find_duplicates(folder, image_files, file_stats, args.threshold, args.window, args.workers, progress)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(groups, f, indent=2, ensure_ascii=False)
+    else:
+        for group in groups:
+            print(", ".join(group))
+    grouped = sum(len(group) for group in groups)
+    print(f"{grouped} of {len(image_files)} images in {len(groups)} group(s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
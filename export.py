@@ -0,0 +1,260 @@
+"""
+Stream annotations out as JSONL, CSV or per-label file lists.
+
+    python export.py jsonl out.jsonl [--config data_config.json]
+    python export.py csv out.csv --annotations path/to/annotations.json
+    python export.py lists out_dir --label blurry --val-fraction 0.1
+
+Records are produced one at a time by generators, so memory use does not grow
+with the number of images. Reads annotations.json (current or legacy format)
+plus the edits still in its journal, from the folder configured in
+data_config.json or the file given with --annotations; the sqlite storage is
+read through its store. Does not import tkinter.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+
+from annotation_store import AnnotationJournal
+from config import DataConfig
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _JsonStream:
+    """Minimal incremental reader for a JSON file whose values are small."""
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ('' at end of file)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Malformed annotations file: expected '{char}' at offset {self.pos}.")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more of the file as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number could continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        """Yield (key, value-reader) for the object starting here; the caller must consume each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+
+def iter_annotation_file(meta_file):
+    """
+    Yield (image_name, annotation) from annotations.json without loading it
+    whole. Handles the {"last_index", "annotations"} format and the legacy
+    format (a plain image -> annotation mapping).
+    """
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f)
+        for key in stream.members():
+            if key == "annotations" and stream.peek() == "{":
+                for image_name in stream.members():
+                    yield image_name, stream.value()
+            elif key == "last_index":
+                stream.value()
+            else:
+                # Legacy format: top-level keys are image names
+                yield key, stream.value()
+
+
+def iter_current_annotations(meta_file):
+    """
+    Like iter_annotation_file, with the edits still in the journal next to it
+    (annotations.journal and annotations.journal.1) applied. Only the journal
+    is held in memory; it is small compared to annotations.json.
+    """
+    journal = AnnotationJournal(os.path.join(os.path.dirname(os.path.abspath(meta_file)), "annotations.journal"))
+    pending = {image_name: annotation for image_name, annotation, _ in journal.replay()}
+    if os.path.exists(meta_file):
+        for image_name, annotation in iter_annotation_file(meta_file):
+            yield image_name, pending.pop(image_name, annotation)
+    # Images that only appear in the journal
+    yield from pending.items()
+
+
+def split_of(image_name, val_fraction, seed=0):
+    """Deterministic train/val assignment from a hash of the image name."""
+    if val_fraction <= 0:
+        return "train"
+    digest = hashlib.md5(f"{seed}:{image_name}".encode("utf-8")).digest()
+    return "val" if int.from_bytes(digest[:8], "big") / 2 ** 64 < val_fraction else "train"
+
+
+def iter_records(annotations, data_folder="", labels=None, match_all=False,
+                 include_empty=False, val_fraction=0.0, seed=0):
+    """
+    Turn (image_name, annotation) pairs into export records.
+    :param labels: keep only images with any (or, with match_all, every) of these labels.
+    :param include_empty: also export images with neither labels nor a description.
+    """
+    wanted = set(labels or [])
+    for image_name, annotation in annotations:
+        image_labels = annotation.get("labels", [])
+        description = annotation.get("description", "")
+        if wanted:
+            present = wanted.intersection(image_labels)
+            if not present or (match_all and present != wanted):
+                continue
+        elif not include_empty and not image_labels and not description:
+            continue
+        yield {
+            "image": image_name,
+            "path": os.path.join(data_folder, image_name) if data_folder else image_name,
+            "labels": sorted(image_labels),
+            "description": description,
+            "split": split_of(image_name, val_fraction, seed),
+        }
+
+
+def write_jsonl(records, out_path):
+    count = 0
+    with open(out_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def write_csv(records, out_path, label_names):
+    """One row per image: path, split, description and a 0/1 column per label in label_groups."""
+    count = 0
+    with open(out_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["image", "path", "split", "description"] + list(label_names))
+        for record in records:
+            present = set(record["labels"])
+            writer.writerow(
+                [record["image"], record["path"], record["split"], record["description"]]
+                + [int(label in present) for label in label_names]
+            )
+            count += 1
+    return count
+
+
+def write_class_lists(records, out_dir, split_folders=False):
+    """Write <out_dir>/[<split>/]<label>.txt with one image path per line."""
+    count = 0
+    files = {}
+    try:
+        for record in records:
+            for label in record["labels"]:
+                key = (record["split"], label)
+                if key not in files:
+                    folder = os.path.join(out_dir, record["split"]) if split_folders else out_dir
+                    os.makedirs(folder, exist_ok=True)
+                    files[key] = open(os.path.join(folder, f"{label}.txt"), 'w', encoding='utf-8')
+                files[key].write(record["path"] + "\n")
+            count += 1
+    finally:
+        for f in files.values():
+            f.close()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export annotations as JSONL, CSV or per-label file lists.")
+    parser.add_argument("format", choices=["jsonl", "csv", "lists"])
+    parser.add_argument("out", help="Output file (jsonl/csv) or folder (lists)")
+    parser.add_argument("--config", default="data_config.json", help="DataConfig file")
+    parser.add_argument("--annotations", help="Read this annotations.json (and its journal) instead of the configured folder")
+    parser.add_argument("--label", action="append", default=[], help="Only export images with this label (repeatable)")
+    parser.add_argument("--match-all", action="store_true", help="Require every --label instead of any")
+    parser.add_argument("--include-empty", action="store_true", help="Also export images without labels or description")
+    parser.add_argument("--val-fraction", type=float, default=0.0, help="Fraction of images assigned to the val split")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the train/val split")
+    args = parser.parse_args(argv)
+
+    data_config = DataConfig(args.config) if os.path.exists(args.config) or not args.annotations else None
+    label_names = [label for group in (data_config.get("label_groups", []) if data_config else []) for label in group]
+
+    data_manager = None
+    if args.annotations:
+        data_folder = os.path.dirname(os.path.abspath(args.annotations))
+        annotations = iter_current_annotations(args.annotations)
+    elif data_config.get("storage", "json") == "json":
+        data_folder = data_config.get("folder_path", "")
+        annotations = iter_current_annotations(os.path.join(data_folder, "annotations.json"))
+    else:
+        from data_manager import DataManager
+        data_folder = data_config.get("folder_path", "")
+        data_manager = DataManager(
+            data_folder,
+            storage=data_config.get("storage", "json"),
+            recursive=data_config.get("recursive", False),
+        )
+        annotations = data_manager.annotations.items()
+
+    records = iter_records(
+        annotations, data_folder, args.label, args.match_all,
+        args.include_empty, args.val_fraction, args.seed,
+    )
+    try:
+        if args.format == "jsonl":
+            count = write_jsonl(records, args.out)
+        elif args.format == "csv":
+            if not label_names:
+                parser.error("csv export needs label_groups from --config")
+            count = write_csv(records, args.out, label_names)
+        else:
+            count = write_class_lists(records, args.out, split_folders=args.val_fraction > 0)
+    finally:
+        if data_manager is not None:
+            data_manager.close(save=False)
+    print(f"Exported {count} images to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import queue
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk
+
+from PIL import ImageTk
+
+from image_cache import LRUCache
+from image_loader import load_thumbnail
+
+
+class _Cell:
+    """Canvas items of one recycled filmstrip cell"""
+    __slots__ = ("index", "path", "frame", "image_item", "bars", "photo")
+
+    def __init__(self, frame, image_item, bars):
+        self.index = None
+        self.path = None
+        self.frame = frame
+        self.image_item = image_item
+        self.bars = bars  # one rectangle per label, in label order
+        self.photo = None
+
+
+class Filmstrip(ttk.Frame):
+    """
+    Horizontal strip of thumbnails for all images, virtualized: only the cells
+    in view exist as canvas items and PhotoImages, and they are recycled while
+    scrolling (image i always uses cell i % number of cells). Thumbnails are
+    decoded by a thread pool into a bounded LRU cache. Each cell shows the
+    image's labels as coloured bars.
+    """
+    def __init__(self, master, count, get_path, get_labels, label_colors, on_select,
+                 thumb_size=96, cache_bytes=64 * 1024 * 1024, max_workers=2, disk_cache=None):
+        super().__init__(master)
+        self.count = count
+        self.get_path = get_path  # index -> image path
+        self.get_labels = get_labels  # index -> labels of the image
+        self.label_colors = dict(label_colors)  # label -> colour, in display order
+        self.on_select = on_select
+        self.thumb_size = thumb_size
+        self.disk_cache = disk_cache  # preview_cache.PreviewCache, checked before decoding
+        self.pad = 4
+        self.bar_height = 6
+        self.cell_width = thumb_size + 2 * self.pad
+        self.cell_height = thumb_size + 3 * self.pad + self.bar_height
+        self.offset = 0  # Scroll position in pixels
+        self.current = None
+
+        self.cache = LRUCache(cache_bytes)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        self._pending = {}  # path -> Future
+        self._failed = set()
+        self._results = queue.Queue()  # (path, thumbnail or None) from worker threads
+        self._poll_job = None
+        self._cells = []
+        self._cells_used = 0  # Cells in rotation; extra ones (after shrinking) stay hidden
+
+        self.canvas = tk.Canvas(self, height=self.cell_height, bg="#303030", highlightthickness=0)
+        self.canvas.pack(fill=tk.X)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self._on_scrollbar)
+        self.scrollbar.pack(fill=tk.X)
+
+        self.canvas.bind("<Configure>", lambda e: self._layout())
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", self._on_mousewheel)  # Linux
+        self.canvas.bind("<Button-5>", self._on_mousewheel)  # Linux
+        self.canvas.bind("<Button-1>", self._on_click)
+
+    # --- public API ---
+
+    def set_count(self, count):
+        """Image list changed (positions shifted): re-assign every cell."""
+        self.count = count
+        for cell in self._cells:
+            cell.index = None
+        self._scroll_to(self.offset)
+
+    def set_current(self, index):
+        """Highlight `index` and scroll it into view if it is not visible."""
+        previous, self.current = self.current, index
+        width = self.canvas.winfo_width()
+        left = index * self.cell_width
+        if left < self.offset or left + self.cell_width > self.offset + width:
+            # Center it
+            self._scroll_to(left - (width - self.cell_width) // 2)
+        else:
+            for cell in self._cells:
+                if cell.index in (previous, index):
+                    self._paint(cell)
+
+    def refresh(self, index=None):
+        """Redraw the label bars of `index` (or of every visible cell)."""
+        for cell in self._cells:
+            if cell.index is not None and (index is None or cell.index == index):
+                self._paint(cell)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- layout ---
+
+    def _scroll_to(self, offset):
+        width = self.canvas.winfo_width()
+        self.offset = int(max(0, min(offset, self.count * self.cell_width - width)))
+        self._layout()
+
+    def _layout(self):
+        width = self.canvas.winfo_width()
+        if width <= 1:
+            return
+        needed = width // self.cell_width + 2
+        if needed != self._cells_used:
+            while len(self._cells) < needed:
+                self._cells.append(self._create_cell())
+            # The index -> cell mapping depends on the number of cells
+            for cell in self._cells:
+                cell.index = None
+            self._cells_used = needed
+        first = self.offset // self.cell_width
+        last = min((self.offset + width) // self.cell_width, self.count - 1)
+        used = set()
+        wanted = []
+        for index in range(first, last + 1):
+            cell = self._cells[index % needed]
+            used.add(id(cell))
+            if cell.index != index:
+                self._assign(cell, index)
+            self._place(cell)
+            if cell.photo is None and cell.path not in self._failed:
+                wanted.append(cell.path)
+        for cell in self._cells:
+            if id(cell) not in used:
+                self._hide(cell)
+        self._request(wanted)
+
+        total = max(self.count * self.cell_width, 1)
+        self.scrollbar.set(self.offset / total, min((self.offset + width) / total, 1.0))
+
+    def _create_cell(self):
+        frame = self.canvas.create_rectangle(0, 0, 0, 0, outline="", fill="", state=tk.HIDDEN)
+        image_item = self.canvas.create_image(0, 0, anchor="center", state=tk.HIDDEN)
+        bars = [
+            self.canvas.create_rectangle(0, 0, 0, 0, outline="", fill=color, state=tk.HIDDEN)
+            for color in self.label_colors.values()
+        ]
+        return _Cell(frame, image_item, bars)
+
+    def _assign(self, cell, index):
+        """Recycle `cell` for image `index`."""
+        cell.index = index
+        cell.path = self.get_path(index)
+        thumbnail = self.cache.get(cell.path)
+        cell.photo = ImageTk.PhotoImage(thumbnail) if thumbnail is not None else None
+        self.canvas.itemconfigure(cell.image_item, image=cell.photo or "")
+        self._paint(cell)
+
+    def _paint(self, cell):
+        """Update highlight and label bars (no geometry changes)."""
+        self.canvas.itemconfigure(
+            cell.frame, fill="#ffffff" if cell.index == self.current else "#505050", state=tk.NORMAL
+        )
+        labels = set(self.get_labels(cell.index))
+        for bar, label in zip(cell.bars, self.label_colors):
+            self.canvas.itemconfigure(bar, state=tk.NORMAL if label in labels else tk.HIDDEN)
+        self.canvas.itemconfigure(cell.image_item, state=tk.NORMAL)
+
+    def _place(self, cell):
+        x = cell.index * self.cell_width - self.offset
+        self.canvas.coords(cell.frame, x + 1, 1, x + self.cell_width - 1, self.cell_height - 1)
+        self.canvas.coords(cell.image_item, x + self.cell_width // 2, self.pad + self.thumb_size // 2)
+        if cell.bars:
+            # Each label has a fixed slot, so the same label is always in the same place
+            bar_width = self.thumb_size / len(cell.bars)
+            top = 2 * self.pad + self.thumb_size
+            for i, bar in enumerate(cell.bars):
+                left = x + self.pad + i * bar_width
+                self.canvas.coords(bar, left, top, left + bar_width - 1, top + self.bar_height)
+
+    def _hide(self, cell):
+        cell.index = None
+        cell.path = None
+        cell.photo = None
+        for item in [cell.frame, cell.image_item] + cell.bars:
+            self.canvas.itemconfigure(item, state=tk.HIDDEN)
+
+    # --- thumbnail workers ---
+
+    def _load_thumbnail(self, path):
+        if self.disk_cache is not None:
+            thumbnail = self.disk_cache.load_thumbnail(path, self.thumb_size)
+            if thumbnail is not None:
+                return thumbnail
+        return load_thumbnail(path, self.thumb_size)
+
+    def _request(self, paths):
+        """Decode thumbnails for `paths`; queued work for cells scrolled away is cancelled."""
+        wanted = set(paths)
+        for path, future in list(self._pending.items()):
+            if path not in wanted and future.cancel():
+                del self._pending[path]
+        for path in paths:
+            if path in self._pending or path in self.cache:
+                continue
+            future = self._executor.submit(self._load_thumbnail, path)
+            self._pending[path] = future
+            future.add_done_callback(lambda f, p=path: self._on_done(p, f))
+        if self._pending and self._poll_job is None:
+            self._poll_job = self.after(30, self._poll_results)
+
+    def _on_done(self, path, future):
+        # Runs on a worker thread: hand the result to the UI thread
+        if future.cancelled():
+            return
+        self._results.put((path, None if future.exception() is not None else future.result()))
+
+    def _poll_results(self):
+        self._poll_job = None
+        while True:
+            try:
+                path, thumbnail = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending.pop(path, None)
+            if thumbnail is None:
+                self._failed.add(path)  # Broken file: leave the cell empty
+                continue
+            self.cache.put(path, thumbnail)
+            for cell in self._cells:
+                if cell.path == path and cell.photo is None:
+                    cell.photo = ImageTk.PhotoImage(thumbnail)
+                    self.canvas.itemconfigure(cell.image_item, image=cell.photo)
+        if self._pending:
+            self._poll_job = self.after(30, self._poll_results)
+
+    # --- input ---
+
+    def _on_scrollbar(self, action, value, unit=None):
+        width = self.canvas.winfo_width()
+        if action == "moveto":
+            self._scroll_to(float(value) * self.count * self.cell_width)
+        elif action == "scroll":
+            step = width if unit == "pages" else self.cell_width
+            self._scroll_to(self.offset + int(value) * step)
+
+    def _on_mousewheel(self, event):
+        if event.delta:
+            direction = -1 if event.delta > 0 else 1
+        else:
+            direction = -1 if event.num == 4 else 1
+        self._scroll_to(self.offset + direction * 3 * self.cell_width)
+
+    def _on_click(self, event):
+        index = (self.offset + event.x) // self.cell_width
+        if 0 <= index < self.count:
+            self.on_select(index)
@@ -0,0 +1,143 @@
+import json
+import os
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif')
+MANIFEST_NAME = ".imagelabeller_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def is_image_file(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def scan_dir(path, recursive):
+    """List one directory with os.scandir: image files with their (size, mtime) and subdirectories."""
+    files = []
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            # is_file()/is_dir() use the file type returned by the directory listing
+            if entry.is_file() and is_image_file(entry.name):
+                st = entry.stat()
+                files.append([entry.name, st.st_size, st.st_mtime])
+            elif recursive and entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+    return files, subdirs
+
+
+def list_dir(path, recursive):
+    """
+    Names of the image files and subdirectories in one directory, without
+    stat'ing the files (the file type comes from the directory listing).
+    """
+    names = set()
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_file() and is_image_file(entry.name):
+                names.add(entry.name)
+            elif recursive and entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+    return names, subdirs
+
+
+def _load_manifest(manifest_path, recursive):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("recursive") != recursive:
+        return {}
+    return manifest.get("dirs", {})
+
+
+def scan_images(data_folder, recursive=False, manifest_path=None, update_manifest=True):
+    """
+    Find the images in `data_folder` (and its subfolders if `recursive`).
+    With a manifest, directories whose mtime is unchanged since the last scan
+    are not listed again; directories that changed are re-listed and all
+    their files re-stat'ed, so a file replaced under the same name is picked
+    up. Editing a file in place does not change its directory's mtime, so
+    such edits are only noticed after the manifest is deleted. With
+    update_manifest=False the manifest is only read (nothing is written).
+    :return: (image names sorted by modification time, {name: (size, mtime)}).
+             Names are relative to data_folder and use '/' as separator.
+    """
+    old_dirs = _load_manifest(manifest_path, recursive) if manifest_path else {}
+    if manifest_path and update_manifest and not os.path.exists(manifest_path):
+        # Created before the folder's mtime is read: creating it afterwards would
+        # change that mtime and make the next start list the folder again
+        try:
+            open(manifest_path, 'a').close()
+        except OSError:
+            pass
+    new_dirs = {}
+    changed = False
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        abs_dir = os.path.join(data_folder, rel_dir) if rel_dir else data_folder
+        dir_mtime = os.stat(abs_dir).st_mtime_ns
+        cached = old_dirs.get(rel_dir)
+        if cached is not None and cached["mtime"] == dir_mtime:
+            entry = cached
+        else:
+            files, subdirs = scan_dir(abs_dir, recursive)
+            entry = {"mtime": dir_mtime, "files": files, "subdirs": subdirs}
+            changed = True
+        new_dirs[rel_dir] = entry
+        pending.extend(f"{rel_dir}/{sub}" if rel_dir else sub for sub in entry["subdirs"])
+    changed = changed or new_dirs.keys() != old_dirs.keys()
+
+    stats = {}
+    for rel_dir, entry in new_dirs.items():
+        prefix = f"{rel_dir}/" if rel_dir else ""
+        for name, size, mtime in entry["files"]:
+            stats[prefix + name] = (size, mtime)
+    image_files = sorted(stats, key=lambda name: (stats[name][1], name))
+
+    if manifest_path and update_manifest and changed:
+        _save_manifest(manifest_path, recursive, new_dirs)
+    return image_files, stats
+
+
+def refresh_folder_mtime(manifest_path, data_folder, recursive=False):
+    """
+    Re-list the data folder into the manifest (with a fresh stat of every
+    image) if its mtime changed since the manifest was written. Called after
+    the app's own writes there (annotations.json, sidecar files), which change
+    the folder's mtime, so the next start does not re-list the folder; images
+    added or replaced in the meantime are recorded as they are now.
+    """
+    dirs = _load_manifest(manifest_path, recursive)
+    entry = dirs.get("")
+    if entry is None:
+        return
+    try:
+        # Taken before listing: a change during the listing leaves it stale, so it is re-listed next time
+        dir_mtime = os.stat(data_folder).st_mtime_ns
+        if dir_mtime == entry["mtime"]:
+            return
+        files, subdirs = scan_dir(data_folder, recursive)
+    except OSError:
+        return
+    # Subfolders without an entry are listed by the next scan
+    dirs[""] = {"mtime": dir_mtime, "files": files, "subdirs": subdirs}
+    _save_manifest(manifest_path, recursive, dirs)
+
+
+def _save_manifest(manifest_path, recursive, dirs):
+    # Overwrite in place rather than via temp file + rename: replacing the
+    # file would bump the data folder's mtime and force a re-list next time.
+    # A torn manifest just fails to parse and triggers a full scan.
+    data = json.dumps({"version": MANIFEST_VERSION, "recursive": recursive, "dirs": dirs})
+    try:
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+    except OSError:
+        pass  # A read-only folder just means no warm start next time
@@ -0,0 +1,235 @@
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+
+from folder_scan import is_image_file, list_dir
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _split(name):
+    """Split a '/'-separated image name into (directory, file name)."""
+    rel_dir, _, base = name.rpartition('/')
+    return rel_dir, base
+
+
+def _join(rel_dir, base):
+    return f"{rel_dir}/{base}" if rel_dir else base
+
+
+class FolderWatcher:
+    """
+    Reports image files added to or removed from the data folder while the app
+    runs. Uses inotify on Linux and falls back to polling directory mtimes.
+    Batches of changes are put on `changes` as (added {name: (size, mtime)}, removed [names]);
+    the UI thread drains it.
+    """
+    def __init__(self, data_folder, file_stats, recursive=False, poll_interval=2.0, batch_delay=0.5):
+        self.data_folder = data_folder
+        self.recursive = recursive
+        self.poll_interval = poll_interval
+        self.batch_delay = batch_delay
+        self.changes = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        # rel_dir -> [dir mtime_ns, set of image file names]; only touched by the watcher thread
+        self._dirs = {"": [None, set()]}
+        for name in file_stats:
+            rel_dir, base = _split(name)
+            self._dirs.setdefault(rel_dir, [None, set()])[1].add(base)
+        for rel_dir, entry in list(self._dirs.items()):
+            entry[0] = self._dir_mtime(rel_dir)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _abs(self, rel_dir):
+        return os.path.join(self.data_folder, rel_dir) if rel_dir else self.data_folder
+
+    def _dir_mtime(self, rel_dir):
+        try:
+            return os.stat(self._abs(rel_dir)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run(self):
+        fd = self._inotify_init() if sys.platform.startswith("linux") else -1
+        if fd >= 0:
+            try:
+                self._run_inotify(fd)
+            finally:
+                os.close(fd)
+        else:
+            self._run_polling()
+
+    # --- polling fallback ---
+
+    def _run_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            added, removed = {}, []
+            for rel_dir in list(self._dirs):
+                if rel_dir in self._dirs and self._dir_mtime(rel_dir) != self._dirs[rel_dir][0]:
+                    self._rescan_dir(rel_dir, added, removed)
+            self._post(added, removed)
+
+    def _rescan_dir(self, rel_dir, added, removed):
+        """Re-list one directory and record the difference with what was known."""
+        old_mtime, old_files = self._dirs.get(rel_dir, (None, set()))
+        mtime = self._dir_mtime(rel_dir)
+        if mtime is None:
+            self._forget_dir(rel_dir, removed)
+            return
+        try:
+            # Names only: the app's own writes (annotations.json, sidecars) change the
+            # folder's mtime on every save, so most re-lists find no image changes
+            new_files, subdirs = list_dir(self._abs(rel_dir), self.recursive)
+        except OSError:
+            return
+        for base in new_files - old_files:
+            stat = self._stat(_join(rel_dir, base))
+            if stat is None:
+                new_files.discard(base)  # Gone again; picked up by the next re-list if it returns
+            else:
+                added[_join(rel_dir, base)] = stat
+        removed.extend(_join(rel_dir, base) for base in old_files - new_files)
+        self._dirs[rel_dir] = [mtime, new_files]
+        for sub in subdirs:
+            sub_dir = _join(rel_dir, sub)
+            if sub_dir not in self._dirs:
+                self._rescan_dir(sub_dir, added, removed)
+                self._on_new_dir(sub_dir)
+
+    def _forget_dir(self, rel_dir, removed):
+        prefix = rel_dir + "/"
+        for known_dir in [d for d in self._dirs if d == rel_dir or d.startswith(prefix)]:
+            _, files = self._dirs.pop(known_dir)
+            removed.extend(_join(known_dir, base) for base in files)
+
+    def _post(self, added, removed):
+        if added or removed:
+            self.changes.put((added, removed))
+
+    # --- inotify ---
+
+    def _inotify_init(self):
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = self._libc.inotify_init1(IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return -1
+        if fd < 0:
+            return -1
+        self._fd = fd
+        self._watches = {}  # wd -> rel_dir
+        for rel_dir in list(self._dirs):
+            if not self._add_watch(rel_dir):
+                os.close(fd)
+                return -1  # e.g. watch limit reached: poll instead
+        return fd
+
+    def _add_watch(self, rel_dir):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(self._abs(rel_dir)), WATCH_MASK)
+        if wd < 0:
+            return False
+        self._watches[wd] = rel_dir
+        return True
+
+    def _on_new_dir(self, rel_dir):
+        """Register a directory found after startup (needs its own inotify watch)."""
+        if getattr(self, "_watches", None) is not None:
+            self._add_watch(rel_dir)
+
+    def _run_inotify(self, fd):
+        while not self._stop.is_set():
+            ready, _, _ = select.select([fd], [], [], 1.0)
+            if not ready:
+                continue
+            # Let the rest of a burst (e.g. a batch copy) arrive, then handle it as one batch
+            self._stop.wait(self.batch_delay)
+            buffer = os.read(fd, 1024 * 1024)
+            added, removed = {}, []
+            touched = {}  # image name -> whether it was known before this batch
+            for wd, mask, name in self._parse_events(buffer):
+                self._handle_event(wd, mask, name, added, removed, touched)
+            # Only report the net effect of files that came and went within the batch
+            for image_name, was_known in touched.items():
+                rel_dir, base = _split(image_name)
+                is_known = rel_dir in self._dirs and base in self._dirs[rel_dir][1]
+                if was_known and not is_known:
+                    removed.append(image_name)
+                elif is_known and not was_known:
+                    added[image_name] = self._stat(image_name)
+            self._post({k: v for k, v in added.items() if v is not None}, removed)
+
+    def _parse_events(self, buffer):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b"\0")
+            offset += length
+            yield wd, mask, os.fsdecode(name)
+
+    def _handle_event(self, wd, mask, name, added, removed, touched):
+        if mask & IN_Q_OVERFLOW:
+            # Events were lost: fall back to comparing every directory
+            for rel_dir in list(self._dirs):
+                if rel_dir in self._dirs:
+                    self._rescan_dir(rel_dir, added, removed)
+            return
+        rel_dir = self._watches.get(wd)
+        if rel_dir is None:
+            return
+        if mask & (IN_IGNORED | IN_DELETE_SELF):
+            self._watches.pop(wd, None)
+            return
+        if mask & IN_ISDIR:
+            if not self.recursive or name.startswith('.'):
+                return
+            sub_dir = _join(rel_dir, name)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._rescan_dir(sub_dir, added, removed)
+                self._on_new_dir(sub_dir)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget_dir(sub_dir, removed)
+            return
+        if name.startswith('.') or not is_image_file(name) or rel_dir not in self._dirs:
+            return
+        files = self._dirs[rel_dir][1]
+        image_name = _join(rel_dir, name)
+        touched.setdefault(image_name, name in files)
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            # IN_CREATE is ignored on purpose: the file may still be being written
+            files.add(name)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            files.discard(name)
+
+    def _stat(self, image_name):
+        try:
+            st = os.stat(os.path.join(self.data_folder, image_name))
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
@@ -0,0 +1,167 @@
+import itertools
+import math
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from profiling import profiler
+
+# Modes that Image.reduce and ImageTk.PhotoImage both handle directly
+PYRAMID_MODES = ("L", "LA", "RGB", "RGBA")
+
+
+def to_display_mode(image):
+    """Convert an image to a mode that can be reduced and shown without further conversion."""
+    if image.mode in PYRAMID_MODES:
+        return image
+    return image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+
+def image_nbytes(image):
+    """Approximate the memory used by a decoded image."""
+    return image.width * image.height * len(image.getbands())
+
+
+class LRUCache:
+    """Least-recently-used cache bounded by the total size of its values"""
+    def __init__(self, max_bytes, sizeof=image_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return  # Never cache something that would evict everything else
+            self._items[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+
+class ImagePyramid:
+    """
+    Power-of-two downscaled levels of one image, built lazily.
+    Level 0 is the full-resolution image; level k is it reduced by 2**k.
+    The pyramid may start from a reduced decode (`full_size` larger than the
+    image given); full resolution is then fetched through `loader` only when
+    a render needs a level above it.
+    Levels and recently rendered outputs are stored in a shared LRUCache.
+    """
+    _ids = itertools.count()
+
+    def __init__(self, image, cache, full_size=None, loader=None):
+        self.base_image = to_display_mode(image)
+        self.full_size = tuple(full_size or image.size)
+        self.loader = loader
+        self.full_image = self.base_image if self.base_image.size == self.full_size else None
+        self.cache = cache
+        self.key = next(self._ids)
+        # Level that the given image corresponds to (0 unless it is a reduced decode)
+        self.base_level = max(int(round(math.log2(self.full_size[0] / self.base_image.width))), 0)
+        # Stop once the smallest side would drop below one pixel
+        self.max_level = max(int(math.log2(max(min(self.full_size), 1))), self.base_level)
+
+    @property
+    def size(self):
+        return self.full_size
+
+    @property
+    def image(self):
+        """The highest resolution decoded so far."""
+        return self.full_image if self.full_image is not None else self.base_image
+
+    def level_for_scale(self, scale):
+        """Return the smallest level whose resolution is still at or above `scale`."""
+        if scale <= 0:
+            return self.max_level
+        level = int(math.floor(math.log2(1.0 / scale))) if scale < 1 else 0
+        return max(0, min(level, self.max_level))
+
+    def get_level(self, level):
+        """Return (and cache) the image for `level`, building it from the level above."""
+        if level == self.base_level:
+            return self.base_image
+        if level < self.base_level and self.full_image is None:
+            if self.loader is None:
+                return self.base_image  # Best resolution available
+            self.full_image = to_display_mode(self.loader())
+        if level <= 0:
+            return self.full_image
+        key = (self.key, "level", level)
+        image = self.cache.get(key)
+        if image is None:
+            image = self.get_level(level - 1).reduce(2)
+            self.cache.put(key, image)
+        return image
+
+    def _render_key(self, box, size, resample):
+        return (self.key, "render", tuple(round(v, 3) for v in box), tuple(size), resample)
+
+    def seed(self, box, size, resample, image):
+        """Store an output rendered elsewhere (e.g. by the prefetcher) for reuse by render()."""
+        self.cache.put(self._render_key(box, size, resample), image)
+
+    def render(self, box, size, resample=Image.LANCZOS, store=True, allow_load=True):
+        """
+        Resample the source region `box` (level-0 coordinates) to `size`,
+        starting from the nearest pyramid level above the target scale.
+        Pass store=False for throwaway outputs (e.g. while dragging) so they
+        do not evict pyramid levels from the cache, and allow_load=False to
+        upsample the reduced decode instead of loading full resolution.
+        """
+        key = self._render_key(box, size, resample)
+        image = self.cache.get(key)
+        if image is not None:
+            return image
+
+        scale = min(size[0] / max(box[2] - box[0], 1e-9), size[1] / max(box[3] - box[1], 1e-9))
+        level = self.level_for_scale(scale)
+        if level < self.base_level and self.full_image is None and not allow_load:
+            level = self.base_level
+            store = False  # Lower quality than requested, do not reuse it
+        source = self.get_level(level)
+        # Map the box into the level's coordinates (reduce() rounds sizes up)
+        fx = source.width / self.full_size[0]
+        fy = source.height / self.full_size[1]
+        level_box = (
+            box[0] * fx,
+            box[1] * fy,
+            min(box[2] * fx, source.width),
+            min(box[3] * fy, source.height),
+        )
+        with profiler.timer("resize"):
+            image = source.resize(tuple(size), resample, box=level_box)
+        if store:
+            self.cache.put(key, image)
+        return image
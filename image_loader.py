@@ -0,0 +1,191 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+from PIL import Image
+
+from image_cache import LRUCache, image_nbytes, to_display_mode
+from profiling import profiler
+
+
+def fit_size(image_size, canvas_size):
+    """Size of an image scaled to fit inside the canvas (same rounding as the UI)."""
+    img_width, img_height = image_size
+    canvas_width, canvas_height = canvas_size
+    zoom = min(canvas_width / img_width, canvas_height / img_height)
+    return int(img_width * zoom), int(img_height * zoom)
+
+
+def reduce_factor(image_size, min_size, max_factor=8):
+    """Largest power of two (up to max_factor) the image can shrink by while still covering min_size."""
+    factor = 1
+    while (factor * 2 <= max_factor
+           and image_size[0] // (factor * 2) >= min_size[0]
+           and image_size[1] // (factor * 2) >= min_size[1]):
+        factor *= 2
+    return factor
+
+
+def decode_image(path, min_size=None):
+    """
+    Open and decode an image, converted to a displayable mode.
+    :return: (image, full_size) where full_size is the native resolution.
+    """
+    with Image.open(path) as img:
+        return _decode_opened(img, min_size)
+
+
+@profiler.timed("decode")
+def _decode_opened(img, min_size=None):
+    """
+    Decode an opened image. If `min_size` is given, it is decoded at 1/2, 1/4
+    or 1/8 scale as long as the result still covers `min_size`. JPEG does this
+    inside the decoder (draft mode); other formats are reduced right after
+    decoding so only the smaller copy stays in memory.
+    """
+    full_size = img.size
+    if min_size:
+        img.draft(None, min_size)
+    img.load()
+    image = to_display_mode(img)
+    if min_size:
+        factor = reduce_factor(image.size, min_size)
+        if factor > 1:
+            image = image.reduce(factor)
+    return image, full_size
+
+
+class DecodedImage:
+    """A (possibly reduced-resolution) decoded image plus its fit-to-canvas preview"""
+    __slots__ = ("path", "image", "full_size", "preview", "canvas_size")
+
+    def __init__(self, path, image, full_size=None, preview=None, canvas_size=None):
+        self.path = path
+        self.image = image
+        self.full_size = full_size or image.size
+        self.preview = preview
+        self.canvas_size = canvas_size
+
+    @property
+    def is_reduced(self):
+        return self.image.size != self.full_size
+
+    @property
+    def nbytes(self):
+        size = image_nbytes(self.image)
+        if self.preview is not None:
+            size += image_nbytes(self.preview)
+        return size
+
+
+def decode_for_fit(path, canvas_size):
+    """(image, full_size) with just enough resolution (a power-of-two reduction) for the fit view of `canvas_size`."""
+    with Image.open(path) as img:
+        size = fit_size(img.size, canvas_size)
+        return _decode_opened(img, (max(size[0], 1), max(size[1], 1)))
+
+
+def load_decoded_image(path, canvas_size=None, reduced=True, disk_cache=None):
+    """
+    Decode `path` and, if a canvas size is known, pre-render its fit view.
+    With `reduced`, only enough resolution for the fit view is decoded.
+    A `disk_cache` (preview_cache.PreviewCache) holding enough resolution is used first.
+    """
+    if disk_cache is not None:
+        decoded = disk_cache.load_preview(path, canvas_size)
+        if decoded is not None:
+            return decoded
+    with Image.open(path) as img:
+        size = fit_size(img.size, canvas_size) if canvas_size and min(canvas_size) > 1 else None
+        if not size or size[0] <= 0 or size[1] <= 0:
+            image, full_size = _decode_opened(img)
+            return DecodedImage(path, image, full_size)
+        image, full_size = _decode_opened(img, size if reduced else None)
+    with profiler.timer("resize"):
+        preview = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+    return DecodedImage(path, image, full_size, preview, canvas_size)
+
+
+def load_scrub_preview(path, canvas_size):
+    """
+    Cheap fit-to-canvas preview for scrubbing: decoded at the lowest
+    resolution that still covers half the fit size, scaled with BILINEAR.
+    """
+    with Image.open(path) as img:
+        size = fit_size(img.size, canvas_size)
+        if size[0] <= 0 or size[1] <= 0:
+            return None
+        image, _ = _decode_opened(img, (max(size[0] // 2, 1), max(size[1] // 2, 1)))
+    return image.resize(size, Image.BILINEAR)
+
+
+def load_thumbnail(path, max_size):
+    """Decode a thumbnail fitting in (max_size, max_size), using draft/reduced decoding."""
+    with Image.open(path) as img:
+        size = fit_size(img.size, (max_size, max_size))
+        image, _ = _decode_opened(img, (max(size[0], 1), max(size[1], 1)))
+    image.thumbnail((max_size, max_size), Image.BILINEAR, reducing_gap=2.0)
+    return image
+
+
+class ImagePrefetcher:
+    """
+    Decodes images around the current position on a thread pool and keeps
+    the results in a bounded LRU cache, so navigation rarely waits on disk.
+    """
+    def __init__(self, max_bytes=512 * 1024 * 1024, max_workers=2, reduced=True, disk_cache=None):
+        self.reduced = reduced
+        self.disk_cache = disk_cache
+        self.cache = LRUCache(max_bytes, sizeof=lambda entry: entry.nbytes)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._pending = {}  # path -> Future
+        # Re-entrant: done-callbacks of already finished futures run inside prefetch()
+        self._lock = threading.RLock()
+
+    def get(self, path, canvas_size=None):
+        """
+        Return the DecodedImage for `path`, waiting for an in-flight prefetch
+        or decoding on the calling thread if it was never requested.
+        """
+        entry = self.cache.get(path)
+        if entry is not None:
+            return entry
+        with self._lock:
+            future = self._pending.get(path)
+        if future is not None:
+            try:
+                entry = future.result()
+            except (CancelledError, OSError):
+                entry = None
+        if entry is None:
+            entry = load_decoded_image(path, canvas_size, self.reduced, self.disk_cache)
+            self.cache.put(path, entry)
+        return entry
+
+    def prefetch(self, paths, canvas_size=None):
+        """
+        Queue `paths` (most wanted first) for decoding. Queued work for paths
+        that are no longer wanted is cancelled if it has not started yet.
+        """
+        wanted = set(paths)
+        with self._lock:
+            for path, future in list(self._pending.items()):
+                if path not in wanted and future.cancel():
+                    del self._pending[path]
+            for path in paths:
+                if path in self._pending or path in self.cache:
+                    continue
+                future = self._executor.submit(load_decoded_image, path, canvas_size, self.reduced, self.disk_cache)
+                self._pending[path] = future
+                future.add_done_callback(lambda f, p=path: self._on_done(p, f))
+
+    def _on_done(self, path, future):
+        # Cache before dropping the pending entry so get() always finds one of them
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(path, future.result())
+        # A broken file is reported when the UI actually loads it
+        with self._lock:
+            if self._pending.get(path) is future:
+                del self._pending[path]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,12 +1,36 @@
+import argparse
+import multiprocessing
 import os
+import queue
 import sys
+import threading
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-
-from PIL import Image, ImageTk
+from tkinter import ttk, messagebox, filedialog, simpledialog
 
 from config import ProgramConfig, DataConfig
-from data_manager import DataManager
+from annotation_index import NEAR_DUPLICATES, UNLABELED, UNDESCRIBED, label_filter
+from annotation_store import AnnotationJournal
+from data_manager import DataManager, read_resume_hint
+from folder_watcher import FolderWatcher
+from profiling import profiler
+from session_log import SessionLog
+from shards import ShardSpec
+
+# Pillow and the modules built on it are imported by the startup thread
+# (see _import_imaging) so the window can appear first.
+Image = ImageTk = None
+Filmstrip = LRUCache = ImagePyramid = ImagePrefetcher = decode_image = load_scrub_preview = None
+PreviewCache = warm_cache = None
+
+
+def _import_imaging():
+    global Image, ImageTk, Filmstrip, LRUCache, ImagePyramid, ImagePrefetcher, decode_image, load_scrub_preview
+    global PreviewCache, warm_cache
+    from PIL import Image, ImageTk
+    from filmstrip import Filmstrip
+    from image_cache import LRUCache, ImagePyramid
+    from image_loader import ImagePrefetcher, decode_image, load_scrub_preview
+    from preview_cache import PreviewCache, warm_cache
 
 def resource_path(relative_path):
     """
@@ -38,9 +62,11 @@ class AnnotationUI(tk.Tk):
     This class initializes the main window, loads configurations, sets up the UI,
     and handles user interactions for annotating images.
     """
-    def __init__(self):
+    def __init__(self, profile_path=None):
         super().__init__()
         self.geometry("800x1200")
+        # Where to write the timing summary on close (with --profile)
+        self.profile_path = profile_path
         # Check if the resource files in the same directory exist
         program_config_path = resource_path("program_config.json")
         data_config_path = resource_path("data_config.json")
@@ -84,13 +110,116 @@ class AnnotationUI(tk.Tk):
                 else:
                     messagebox.showwarning("Warning", "Please select a valid image data folder.")
         self.title(os.path.basename(self.data_folder))
-        self.data_manager = DataManager(self.data_folder)
-        
+        self.shard = ShardSpec.from_config(self.data_config.get("shard"))
+        if self.shard is not None:
+            self.title(f"{os.path.basename(self.data_folder)} - {self.shard.annotator} ({self.shard.index + 1}/{self.shard.count})")
+
+        # The folder scan and annotation parsing run on a startup thread; until
+        # they finish data_manager is None and the window shows a loading state.
+        self.data_manager = None
+        self.folder_watcher = None
+        self._early_image = None  # Image shown from the resume hint before the full load
+        self._early_index = 0  # Its position in the last session
+        self._save_error = None  # Last background save error reported in the log
+        self._early_annotation = None  # Changes made to it in the meantime
+        self._startup_queue = queue.Queue()
+        # Long-running jobs ("Find similar", "Cache previews"), see _start_background_job
+        self._job_threads = []
+        self._jobs_cancel = threading.Event()
+
         self._setup_ui()
         self._bind_events()
-        self.load_image()
-        self.after(100, self._activate_on_windows)  # Activate the window after a short delay
         self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self._startup_thread = threading.Thread(target=self._load_in_background, name="startup", daemon=True)
+        self._startup_thread.start()
+        self.after(20, self._poll_startup)
+        self.after(100, self._activate_on_windows)  # Activate the window after a short delay
+
+    def _load_in_background(self):
+        """Startup thread: imports, then the resume hint, then the full folder load."""
+        post = self._startup_queue.put
+        try:
+            _import_imaging()
+            post(("imaging", None))
+            storage = self.data_config.get("storage", "json")
+            if storage == "json" and self.shard is None:
+                hint = read_resume_hint(self.data_folder)
+                if hint is not None:
+                    post(("hint", hint))
+            # The json stores intern labels in the configured order
+            labels = [label for group in self.data_config.get("label_groups", []) for label in group]
+            store_options = {"labels": labels} if storage == "json" else {}
+            data_manager = DataManager(
+                self.data_folder,
+                storage=storage,
+                recursive=self.data_config.get("recursive", False),
+                shard=self.shard,
+                **store_options,
+            )
+            post(("loaded", data_manager))
+        except Exception as e:
+            post(("error", e))
+
+    def _poll_startup(self):
+        while True:
+            try:
+                kind, value = self._startup_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "imaging":
+                self._setup_imaging()
+            elif kind == "hint":
+                self._show_resume_hint(value)
+            elif kind == "loaded":
+                self._adopt_data_manager(value)
+                self._on_data_loaded()
+                return
+            else:
+                messagebox.showerror("Error", f"Could not load '{self.data_folder}':\n{value}")
+                self.destroy()
+                return
+        self.after(20, self._poll_startup)
+
+    def _show_resume_hint(self, hint):
+        """Show the image the last session ended on, before the folder has been scanned."""
+        image_path = os.path.join(self.data_folder, hint["image"])
+        try:
+            decoded = self.prefetcher.get(image_path, self._canvas_size())
+        except OSError:
+            return
+        self._early_image = hint["image"]
+        self._early_index = hint["index"]
+        self._display_decoded(decoded, image_path)
+        self.filename_var.set(os.path.basename(image_path))
+        self._display_annotation(hint["annotation"])
+
+    def _adopt_data_manager(self, data_manager):
+        """Take over the loaded data, applying changes made to the early image meanwhile."""
+        self.data_manager = data_manager
+        if self._early_image is not None and self._early_annotation is not None:
+            if data_manager.get_current_name() == self._early_image:
+                data_manager.set_current_annotation(self._early_annotation)
+            else:
+                data_manager.store.put(self._early_image, self._early_annotation, data_manager.current_index)
+                data_manager.index.rebuild(data_manager.image_files, data_manager.annotations)
+        self._early_annotation = None
+
+    def _on_data_loaded(self):
+        if self.filmstrip is not None:
+            self.filmstrip.set_count(len(self.data_manager.image_files))
+        if not self.data_manager.image_files:
+            self.log_message(f"No images found in {self.data_folder}", "warning")
+            return
+        self.data_manager.current_index = max(0, min(self.data_manager.current_index, len(self.data_manager.image_files) - 1))
+        if self._early_image == self.data_manager.get_current_name():
+            # Already on screen (and possibly being edited): keep the widgets as they are
+            self._update_progress()
+            self._prefetch_neighbours()
+        else:
+            self.load_image()
+        self._early_image = None
+        self._start_folder_watcher()
+        self.after(2000, self._poll_save_errors)
 
     def _activate_on_windows(self):
         # Lift the window to the top and focus it
@@ -101,9 +230,69 @@ class AnnotationUI(tk.Tk):
     def _on_close(self):
         # make sure the current annotation + index get saved
         self.save_current_annotation()
-        self.data_manager.save_annotations()
+        if self.data_manager is None:
+            self._close_while_loading()
+        self._jobs_cancel.set()
+        for thread in list(self._job_threads):
+            thread.join()
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+        if self.filmstrip is not None:
+            self.filmstrip.shutdown()
+        # flushes pending background writes and stops the writer
+        if self.data_manager is not None:
+            try:
+                self.data_manager.close()
+            except OSError as e:
+                messagebox.showerror(
+                    "Error",
+                    f"Could not save the annotations:\n{e}\n\n"
+                    "Changes that reached annotations.journal are applied the next time the folder is opened.",
+                )
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+        self.session_log.close()
+        if profiler.enabled:
+            print(profiler.report())
+            if self.profile_path:
+                profiler.dump(self.profile_path)
         self.destroy()
 
+    def _poll_save_errors(self):
+        """Report background saves that failed (disk full, no permission, ...) and when saving works again."""
+        error = self.data_manager.store.save_error
+        # Each retry raises a new exception object: only report a different failure
+        if error is not None and (self._save_error is None or str(error) != str(self._save_error)):
+            self.log_message(f"Could not save the annotations (retrying): {error}", "error")
+        elif error is None and self._save_error is not None:
+            self.log_message("Annotations saved again")
+        self._save_error = error
+        self.after(2000, self._poll_save_errors)
+
+    def _close_while_loading(self):
+        """
+        Closing before the startup thread is done: take its result if it is
+        already queued; otherwise leave it (a daemon thread) behind rather than
+        wait for the scan, and keep edits to the early image in the journal,
+        which the next load replays.
+        """
+        while True:
+            try:
+                kind, value = self._startup_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "loaded":
+                self._adopt_data_manager(value)
+                return
+        if self._early_image is not None and self._early_annotation is not None:
+            journal = AnnotationJournal(os.path.join(self.data_folder, "annotations.journal"))
+            try:
+                journal.append(self._early_image, self._early_annotation, self._early_index)
+            except OSError as e:
+                self.log_message(f"Could not save the annotation of {self._early_image}: {e}", "error")
+            finally:
+                journal.close()
+
     def _setup_ui(self):
         # Title
         self.label_frame = ttk.Frame(self)
@@ -112,6 +301,7 @@ class AnnotationUI(tk.Tk):
         # Label buttons
         self.label_buttons = []
         self.selected_labels = set()
+        self.shown_labels = []  # Labels of the displayed entry, in stored order
         self.label_key_map = {}  # 用于存储标签和快捷键的映射
         label_groups = self.data_config.get("label_groups", [])
         color_list = ["#e57373", "#64b5f6", "#81c784", "#ffd54f", "#ba68c8", "#4db6ac", "#f06292", "#a1887f"]
@@ -145,6 +335,13 @@ class AnnotationUI(tk.Tk):
         self.zoom_factor = 1.0
         self.fit_zoom_factor = 1.0  # Store the fit-to-canvas zoom factor
         self.current_image = None  # Initialize to avoid AttributeError
+        self.image_pyramid = None
+        # Created by _setup_imaging once Pillow has been imported
+        self.render_cache = None
+        self.prefetcher = None
+        self.filmstrip = None
+        self.preview_cache = None
+        self.prefetch_radius = self.program_config.get("prefetch_radius", 2)
         self.image_x = 0  # Initialize pan position
         self.image_y = 0  # Initialize pan position
         self.pan_start_x = 0
@@ -153,6 +350,29 @@ class AnnotationUI(tk.Tk):
         self.image_y = 0
         self.is_panning = False
 
+        # Render scheduling: interactive input is coalesced into at most one cheap
+        # render per frame, and a LANCZOS pass runs once the input goes idle.
+        self.render_frame_ms = 16
+        self.refine_delay_ms = self.program_config.get("refine_delay_ms", 150)
+        self.pan_margin = 0.25  # Extra area rendered around the viewport while interacting (fraction of canvas)
+        self._frame_job = None
+        self._refine_job = None
+        self.image_id = None
+        self._rendered_rect = None  # Canvas area covered by the image item
+        self._rendered_zoom = None  # Zoom factor the image item was rendered at
+        self._rendered_fine = False  # Whether the image item is a LANCZOS render
+
+        # Scrubbing: while the index slider is dragged or an arrow key auto-repeats,
+        # only a low-res preview and the filename are shown; the full image and
+        # annotation UI are loaded once the input settles.
+        self.scrub_settle_ms = self.program_config.get("scrub_settle_ms", 150)
+        self.scrub_repeat_ms = 100  # Key presses closer together than this count as auto-repeat
+        self._scrubbing = False
+        self._scrub_origin = 0  # Image the annotation widgets show during a scrub
+        self._scrub_frame_job = None
+        self._scrub_settle_job = None
+        self._last_nav_key_time = None
+
         # Image display area with zoom scrollbar
         self.image_frame = ttk.Frame(self)
         self.image_frame.pack(expand=True, fill=tk.BOTH)
@@ -176,6 +396,11 @@ class AnnotationUI(tk.Tk):
         self.zoom_scrollbar.set(100)  # Start at 100% (fit-to-canvas)
         self.zoom_scrollbar.pack(fill=tk.Y, side=tk.RIGHT, padx=(5, 0))
 
+        # Shown until the startup thread has loaded the folder
+        self.loading_text_id = self.canvas.create_text(
+            10, 10, anchor="nw", fill="gray", text=f"Loading {self.data_folder} ..."
+        )
+
         # Navigation control area
         self.nav_frame = ttk.Frame(self)
         self.nav_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -184,11 +409,12 @@ class AnnotationUI(tk.Tk):
         self.index_scale = ttk.Scale(
             self.nav_frame,
             from_=1,
-            to=len(self.data_manager.image_files),
+            to=1,  # Set to the number of images once they are loaded
             orient=tk.HORIZONTAL,
             command=self.on_scale_move
         )
         self.index_scale.pack(fill=tk.X, side=tk.TOP)
+        self.index_scale.bind("<ButtonRelease-1>", lambda e: self._end_scrub())
 
         # Description + entry box for quick jump
         quick_jump_label = ttk.Label(
@@ -196,11 +422,42 @@ class AnnotationUI(tk.Tk):
             text="Quick jump to image index:"
         )
         quick_jump_label.pack(side=tk.LEFT, padx=(0,5))
-        self.index_var = tk.IntVar(value=self.data_manager.current_index + 1)
+        self.index_var = tk.IntVar(value=1)
         self.index_entry = ttk.Entry(self.nav_frame, textvariable=self.index_var, width=5)
         self.index_entry.pack(side=tk.LEFT, padx=(0,5))
         self.index_entry.bind("<Return>", self.on_index_entry)
 
+        # Filter view: next/previous only visit images matching a label or status
+        filter_label = ttk.Label(self.nav_frame, text="Show:")
+        filter_label.pack(side=tk.LEFT, padx=(10,5))
+        self.filter_options = {
+            "All images": None, "Unlabeled": UNLABELED, "No description": UNDESCRIBED, "Near-duplicates": NEAR_DUPLICATES,
+        }
+        for group in label_groups:
+            for label in group:
+                self.filter_options[f"Label: {label}"] = label_filter(label)
+        self.filter_var = tk.StringVar(value="All images")
+        self.filter_combo = ttk.Combobox(
+            self.nav_frame,
+            textvariable=self.filter_var,
+            values=list(self.filter_options),
+            state="readonly",
+            width=20,
+        )
+        self.filter_combo.pack(side=tk.LEFT)
+        self.filter_combo.bind("<<ComboboxSelected>>", self.on_filter_selected)
+        # Groups burst shots for the "Near-duplicates" filter
+        self.similar_button = ttk.Button(self.nav_frame, text="Find similar", command=self.find_similar_images)
+        self.similar_button.pack(side=tk.LEFT, padx=(5,0))
+        # Decodes the whole folder ahead of time into the on-disk preview cache
+        self.cache_button = ttk.Button(self.nav_frame, text="Cache previews", command=self.warm_preview_cache)
+        if self.program_config.get("preview_cache", True):
+            self.cache_button.pack(side=tk.LEFT, padx=(5,0))
+        # Adds the selected labels to a range of images in one batched write
+        self.apply_range_button = ttk.Button(self.nav_frame, text="Apply labels to range...",
+                                             command=self.apply_labels_to_range)
+        self.apply_range_button.pack(side=tk.LEFT, padx=(5,0))
+
         # Info area
         self.info_frame = ttk.Frame(self)
         self.info_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -221,6 +478,13 @@ class AnnotationUI(tk.Tk):
         self.progress_label = ttk.Label(self.info_frame, text="")
         self.progress_label.pack(side=tk.RIGHT)
 
+        # - Timing overlay (with --profile): p50/p95 of the per-image stages
+        self.profile_label = None
+        if profiler.enabled:
+            self.profile_label = ttk.Label(self.info_frame, text="", foreground="gray")
+            self.profile_label.pack(side=tk.RIGHT, padx=(0, 10))
+            self.after(1000, self._update_profile_overlay)
+
         # Input area
         self.desc_frame = ttk.Frame(self)
         self.desc_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -252,6 +516,10 @@ class AnnotationUI(tk.Tk):
 
         # keep track of each label’s Frames so we can remove them individually
         self.desc_option_frames = {}
+        # every label's option rows are built once and then only packed / unpacked
+        self.desc_option_rows = {}
+        for label in desc_options:
+            self._build_desc_option_rows(label)
 
         # Log area
         self.log_frame = ttk.Frame(self)
@@ -264,6 +532,48 @@ class AnnotationUI(tk.Tk):
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.log_text.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
+        # The widget mirrors a bounded ring buffer; the full history can go to a rotating file
+        self.session_log = SessionLog(
+            capacity=self.program_config.get("log_lines", 500),
+            level=self.program_config.get("log_level", "info"),
+            file_path=self.program_config.get("log_file"),
+            file_level=self.program_config.get("log_file_level", "debug"),
+            on_emit=self._append_log_line,
+        )
+
+    def _setup_imaging(self):
+        """Create the image caches and the filmstrip (called once Pillow is imported)."""
+        # Pyramid levels and recent zoom outputs, shared by all images (LRU evicts old ones)
+        self.render_cache = LRUCache(self.program_config.get("render_cache_mb", 256) * 1024 * 1024)
+        # Previews and thumbnails written by "Cache previews" / preview_cache.py, read before decoding
+        if self.program_config.get("preview_cache", True):
+            self.preview_cache = PreviewCache(
+                self.data_folder,
+                self.program_config.get("preview_cache_size", (1920, 1080)),
+                self.program_config.get("thumbnail_size", 96),
+            )
+        # Decoded images around the current index, filled by background threads
+        # Images are decoded at reduced resolution when the fit view does not need more
+        self.prefetcher = ImagePrefetcher(
+            self.program_config.get("prefetch_cache_mb", 512) * 1024 * 1024,
+            reduced=self.program_config.get("reduced_decode", True),
+            disk_cache=self.preview_cache,
+        )
+        # Thumbnail strip; only the visible cells exist, thumbnails are decoded in the background
+        if self.program_config.get("filmstrip", True):
+            self.filmstrip = Filmstrip(
+                self,
+                0,  # Images are counted once the folder is loaded
+                get_path=lambda index: self.data_manager.get_image_path(index),
+                get_labels=self._labels_at,
+                label_colors=[(label, color) for _, label, _, color in self.label_buttons],
+                on_select=self._on_filmstrip_select,
+                thumb_size=self.program_config.get("thumbnail_size", 96),
+                cache_bytes=self.program_config.get("thumbnail_cache_mb", 64) * 1024 * 1024,
+                disk_cache=self.preview_cache,
+            )
+            self.filmstrip.pack(fill=tk.X, padx=5, before=self.nav_frame)
+
     def _bind_events(self):
         self.bind("<Return>", self.next_image)
         self.bind("<Right>", self.next_image)
@@ -289,10 +599,39 @@ class AnnotationUI(tk.Tk):
         # Allow clicking on the canvas to focus the window
         self.canvas.bind("<Button-1>", lambda e: self.focus_set(), add='+')
 
+    @profiler.timed("load_image")
     def load_image(self):
+        self._cancel_scrub()
         # Load the current image
         image_path = self.data_manager.get_current_image()
-        self.current_image = Image.open(image_path)
+        # Usually already decoded (and fit-resized) by the prefetcher
+        decoded = self.prefetcher.get(image_path, self._canvas_size())
+        self._display_decoded(decoded, image_path)
+        self._prefetch_neighbours()
+        
+        # ...existing code...
+        # self.filename_label.config(text=os.path.basename(image_path))
+        # Update UI elements
+        # now using the read-only Entry’s StringVar
+        self.filename_var.set(os.path.basename(image_path))
+        self._update_progress()
+
+        self.log_message(f"Loaded image: {os.path.basename(image_path)}")
+
+        # Load current annotation
+        self._display_annotation(self.data_manager.get_current_annotation())
+
+    def _display_decoded(self, decoded, image_path):
+        """Show a decoded image fitted to the canvas."""
+        if self.loading_text_id is not None:
+            self.canvas.delete(self.loading_text_id)
+            self.loading_text_id = None
+        self.current_image = decoded.image
+        # Full resolution is only decoded once the user zooms past the reduced decode
+        self.image_pyramid = ImagePyramid(
+            self.current_image, self.render_cache, decoded.full_size,
+            loader=lambda path=image_path: decode_image(path)[0],
+        )
         
         # Reset zoom and pan when loading a new image
         self.zoom_factor = 1.0
@@ -307,44 +646,135 @@ class AnnotationUI(tk.Tk):
             # Canvas might not be ready, try again after a short delay
             self.after(50, lambda: [self._fit_image_to_canvas(), self._show_image()])
         else:
+            self._seed_fit_preview(decoded)
             self._show_image()
-        
-        # ...existing code...
-        # self.filename_label.config(text=os.path.basename(image_path))
-        # Update UI elements
-        # now using the read-only Entry’s StringVar
-        self.filename_var.set(os.path.basename(image_path))
-        self.progress_label.config(
-            text=f"{self.data_manager.current_index+1}/{len(self.data_manager.image_files)}"
-        )
-        # —— 同步导航控件 ——  
-        curr = self.data_manager.current_index + 1
-        self.index_scale.set(curr)
-        self.index_var.set(curr)
-
-        self.log_message(f"Loaded image: {os.path.basename(image_path)}")
 
-        # Load current annotation
-        annotation = self.data_manager.get_current_annotation()
+    def _display_annotation(self, annotation):
+        """Fill the description entry, label buttons and option rows from `annotation`."""
         # - Fill description entry
         self.desc_entry.delete(0, tk.END)
         self.desc_entry.insert(0, annotation.get("description", ""))
         # - Update selected labels
-        self.selected_labels = set(annotation.get("labels", []))
+        self.shown_labels = list(annotation.get("labels", []))
+        self.selected_labels = set(self.shown_labels)
         self.refresh_label_buttons()
         # after refreshing labels, populate options for existing labels
         self.update_desc_options()
 
+    def _update_progress(self):
+        """Sync the progress label and navigation controls with the data manager."""
+        total = len(self.data_manager.image_files)
+        progress = f"{self.data_manager.current_index+1}/{total}"
+        filter_key = self._filter_key()
+        if filter_key is not None:
+            rank, matches = self.data_manager.index.rank(filter_key, self.data_manager.current_index)
+            progress += f"  ({rank or '-'}/{matches} {self.filter_var.get()})"
+        group = self.data_manager.group_of(self.data_manager.current_index)
+        if group:
+            progress += f"  similar {group.index(self.data_manager.current_index) + 1}/{len(group)}"
+        self.progress_label.config(text=progress)
+        # —— 同步导航控件 ——  
+        curr = self.data_manager.current_index + 1
+        self.index_scale.configure(to=max(total, 1))
+        self.index_scale.set(curr)
+        self.index_var.set(curr)
+        if self.filmstrip is not None:
+            self.filmstrip.set_current(self.data_manager.current_index)
+
+    def _labels_at(self, index):
+        return self.data_manager.annotations.get(self.data_manager.image_files[index], {}).get("labels", [])
+
+    def _on_filmstrip_select(self, index):
+        self.focus_set()
+        if self.data_manager is None:
+            return
+        if index != self.data_manager.current_index:
+            self.data_manager.current_index = index
+            self.load_image()
+
+    def _update_profile_overlay(self):
+        summary = profiler.summary()
+        parts = [
+            f"{stage} {summary[stage]['p50_ms']:.0f}/{summary[stage]['p95_ms']:.0f}"
+            for stage in ("load_image", "decode", "resize", "create_image")
+            if stage in summary
+        ]
+        self.profile_label.config(text="  ".join(parts) + (" ms (p50/p95)" if parts else ""))
+        self.after(1000, self._update_profile_overlay)
+
+    def _start_folder_watcher(self):
+        """Watch the data folder for images added or removed during the session."""
+        if not self.data_config.get("watch_folder", True):
+            return
+        self.folder_watcher = FolderWatcher(
+            self.data_folder, self.data_manager.file_stats, recursive=self.data_manager.recursive
+        )
+        self.folder_watcher.start()
+        self.after(1000, self._poll_folder_changes)
+
+    def _poll_folder_changes(self):
+        """Merge folder changes reported by the watcher thread, without reloading the current image."""
+        if self._scrubbing:
+            # Positions must not shift under _scrub_origin; the changes stay queued
+            self.after(1000, self._poll_folder_changes)
+            return
+        current_removed = False
+        changed = False
+        while True:
+            try:
+                added, removed = self.folder_watcher.changes.get_nowait()
+            except queue.Empty:
+                break
+            current_removed |= self.data_manager.apply_folder_changes(added, removed)
+            changed = True
+            self.log_message(f"Folder changed: {len(added)} image(s) added, {len(removed)} removed")
+        if changed and self.filmstrip is not None:
+            self.filmstrip.set_count(len(self.data_manager.image_files))
+        if changed and self.data_manager.image_files:
+            if current_removed:
+                self.load_image()
+            else:
+                self._update_progress()
+        self.after(1000, self._poll_folder_changes)
+
+    def _canvas_size(self):
+        return self.canvas.winfo_width(), self.canvas.winfo_height()
+
+    def _seed_fit_preview(self, decoded):
+        """Reuse the prefetcher's fit-to-canvas render if it matches the current view."""
+        if decoded.preview is None:
+            return
+        viewport = self._compute_viewport(*self._canvas_size())
+        if viewport is not None and viewport[1] == decoded.preview.size:
+            box, size, _ = viewport
+            self.image_pyramid.seed(box, size, Image.LANCZOS, decoded.preview)
+
+    def _prefetch_neighbours(self):
+        """Queue decoding of the images ahead of and behind the current one."""
+        current = self.data_manager.current_index
+        # Ahead first: forward labelling is the common case
+        indices = []
+        for direction in (1, -1):
+            idx = current
+            for _ in range(self.prefetch_radius):
+                idx = self._step_index(idx, direction)
+                if idx is None or idx == current:
+                    break
+                if idx not in indices:
+                    indices.append(idx)
+        paths = [self.data_manager.get_image_path(idx) for idx in indices]
+        self.prefetcher.prefetch(paths, self._canvas_size())
+
     def _fit_image_to_canvas(self):
         """Calculate fit-to-canvas zoom and update min/max accordingly."""
-        if not hasattr(self, 'current_image'):
+        if getattr(self, 'current_image', None) is None:
             return
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
         if canvas_width <= 1 or canvas_height <= 1:
             self.after(50, self._fit_image_to_canvas)
             return
-        img_width, img_height = self.current_image.size
+        img_width, img_height = self.image_pyramid.size
         fit_zoom = min(canvas_width / img_width, canvas_height / img_height)
         self.fit_zoom_factor = fit_zoom
         self.zoom_factor = fit_zoom
@@ -358,13 +788,17 @@ class AnnotationUI(tk.Tk):
             self.zoom_scrollbar.set(100)
 
     def _on_canvas_configure(self, event):
-        if hasattr(self, 'current_image'):
+        if self._scrubbing:
+            return  # The full load at the end of the scrub fits the new size
+        if getattr(self, 'current_image', None) is not None:
             # If at fit zoom, refit; otherwise just redraw
             if abs(self.zoom_factor - self.fit_zoom_factor) < 1e-3:
                 self._fit_image_to_canvas()
             self._show_image()
 
     def _on_mousewheel(self, event):
+        if self.image_pyramid is None:
+            return
         # Get cursor position in canvas coordinates
         x = self.canvas.canvasx(event.x)
         y = self.canvas.canvasy(event.y)
@@ -400,7 +834,7 @@ class AnnotationUI(tk.Tk):
         self.image_y = self.image_y - (rel_y * zoom_ratio - rel_y)
         
         # Display updated image
-        self._show_image()
+        self._request_render()
         
         # Update scrollbar to match the new zoom level
         self._update_zoom_scrollbar()
@@ -418,7 +852,12 @@ class AnnotationUI(tk.Tk):
             self.image_y += dy
             self.pan_start_x = event.x
             self.pan_start_y = event.y
-            self._show_image()
+            # Pure translation: move the existing item, resample only if it no longer covers the view
+            if self._translate_rendered(dx, dy):
+                if not self._rendered_fine:
+                    self._schedule_refine()
+            else:
+                self._request_render()
 
     def _on_pan_end(self, event):
         self.is_panning = False
@@ -430,21 +869,251 @@ class AnnotationUI(tk.Tk):
         self._update_zoom_scrollbar()
 
     def next_image(self, event=None):
-        self.data_manager.current_index = (self.data_manager.current_index + 1) % len(self.data_manager.image_files)
-        self.load_image()
+        self._navigate(1, self._is_key_repeat(event))
         
     def previous_image(self, event=None):
-        self.data_manager.current_index = (self.data_manager.current_index - 1) % len(self.data_manager.image_files)
-        self.load_image()
+        self._navigate(-1, self._is_key_repeat(event))
 
+    def _navigate(self, direction, scrub=False):
+        if self.data_manager is None or not self.data_manager.image_files:
+            return
+        idx = self._step_index(self.data_manager.current_index, direction)
+        if idx is None:
+            self.log_message(f"No images match '{self.filter_var.get()}'", "warning")
+            return
+        if scrub:
+            self._scrub_to(idx)
+        else:
+            self.data_manager.current_index = idx
+            self.load_image()
+
+    def _is_key_repeat(self, event):
+        """Whether a navigation key press follows the previous one as closely as auto-repeat does."""
+        if event is None or not isinstance(getattr(event, "time", None), int):
+            return False
+        last, self._last_nav_key_time = self._last_nav_key_time, event.time
+        return self._scrubbing or (last is not None and 0 <= event.time - last < self.scrub_repeat_ms)
+
+    def _scrub_to(self, idx):
+        """Move to `idx` showing only a preview; the full load happens once input settles."""
+        if not self._scrubbing:
+            self.save_current_annotation()
+            # The entry and labels keep showing this image until the scrub ends
+            self._scrub_origin = self.data_manager.current_index
+            self._scrubbing = True
+            self._cancel_render_jobs()
+        self.data_manager.current_index = idx
+        self.filename_var.set(os.path.basename(self.data_manager.get_image_path(idx)))
+        self._update_progress()
+        # At most one preview per frame, for the latest position
+        if self._scrub_frame_job is None:
+            self._scrub_frame_job = self.after(self.render_frame_ms, self._show_scrub_preview)
+        if self._scrub_settle_job is not None:
+            self.after_cancel(self._scrub_settle_job)
+        self._scrub_settle_job = self.after(self.scrub_settle_ms, self._end_scrub)
+
+    def _show_scrub_preview(self):
+        self._scrub_frame_job = None
+        canvas_size = self._canvas_size()
+        if min(canvas_size) <= 1:
+            return
+        path = self.data_manager.get_current_image()
+        # Prefer what the prefetcher already decoded, then earlier scrub previews
+        decoded = self.prefetcher.cache.get(path)
+        if decoded is not None and decoded.preview is not None and decoded.canvas_size == canvas_size:
+            preview = decoded.preview
+        else:
+            key = ("scrub", path, canvas_size)
+            preview = self.render_cache.get(key)
+            if preview is None:
+                try:
+                    preview = load_scrub_preview(path, canvas_size)
+                except OSError:
+                    preview = None
+                if preview is None:
+                    return
+                self.render_cache.put(key, preview)
+        self.tk_image = ImageTk.PhotoImage(preview)
+        x = (canvas_size[0] - preview.width) // 2
+        y = (canvas_size[1] - preview.height) // 2
+        if self.image_id is None:
+            self.image_id = self.canvas.create_image(x, y, anchor="nw", image=self.tk_image)
+        else:
+            self.canvas.itemconfigure(self.image_id, image=self.tk_image)
+            self.canvas.coords(self.image_id, x, y)
+        # The item no longer shows the current pyramid, so it cannot be panned
+        self._rendered_rect = None
+        self._rendered_zoom = None
+
+    def _end_scrub(self):
+        """Load the image the scrub stopped on."""
+        if self._scrubbing:
+            self.load_image()
+
+    def _cancel_scrub(self):
+        for job in (self._scrub_frame_job, self._scrub_settle_job):
+            if job is not None:
+                self.after_cancel(job)
+        self._scrub_frame_job = None
+        self._scrub_settle_job = None
+        self._scrubbing = False
+
+    def _step_index(self, idx, direction):
+        """Index of the next (direction=1) or previous (-1) image in the current filter view."""
+        filter_key = self._filter_key()
+        if filter_key is None:
+            return (idx + direction) % len(self.data_manager.image_files)
+        return self.data_manager.index.find_next(filter_key, idx, direction)
+
+    def _filter_key(self):
+        return self.filter_options.get(self.filter_var.get())
+
+    def on_filter_selected(self, event=None):
+        """Switch the filter view; jump to the next match if the current image is not one."""
+        self.focus_set()  # Give keyboard shortcuts back to the window
+        if self.data_manager is None:
+            return  # Applied once the folder is loaded
+        filter_key = self._filter_key()
+        if filter_key is not None:
+            rank, matches = self.data_manager.index.rank(filter_key, self.data_manager.current_index)
+            self.log_message(f"Filter '{self.filter_var.get()}': {matches} image(s)")
+            if rank is None and matches:
+                self._navigate(1)
+                return
+        self._update_progress()
+        self._prefetch_neighbours()
+
+
+    def _start_background_job(self, button, busy_text, work, on_done):
+        """
+        Run work(progress, cancel) on a background thread, showing its progress
+        on `button` (disabled meanwhile). on_done(result) runs on the Tk thread;
+        errors are logged.
+        """
+        idle_text = button.cget("text")
+        results = queue.Queue()
+
+        def run():
+            try:
+                progress = lambda done, total: results.put(("progress", (done, total)))
+                results.put(("done", work(progress, self._jobs_cancel)))
+            except Exception as e:
+                results.put(("error", e))
+
+        def poll():
+            while True:
+                try:
+                    kind, value = results.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "progress":
+                    done, total = value
+                    button.configure(text=f"{busy_text} {done * 100 // max(total, 1)}%")
+                    continue
+                self._job_threads.remove(thread)
+                button.configure(state=tk.NORMAL, text=idle_text)
+                if kind == "error":
+                    self.log_message(f"{idle_text} failed: {value}", "error")
+                else:
+                    on_done(value)
+                return
+            self.after(100, poll)
+
+        button.configure(state=tk.DISABLED, text=f"{busy_text}...")
+        thread = threading.Thread(target=run, name=idle_text, daemon=True)
+        self._job_threads.append(thread)
+        thread.start()
+        self.after(100, poll)
+
+    def find_similar_images(self):
+        """Group near-duplicate images; hashing runs on a process pool."""
+        self.focus_set()
+        if self.data_manager is None:
+            return
+        from duplicates import find_duplicates
+        image_files = list(self.data_manager.image_files)
+        file_stats = dict(self.data_manager.file_stats)
+
+        def work(progress, cancel):
+            return find_duplicates(
+                self.data_folder, image_files, file_stats,
+                threshold=self.program_config.get("duplicate_threshold", 6),
+                window=self.program_config.get("duplicate_window", 20),
+                max_workers=self.program_config.get("hash_workers"),
+                progress=progress,
+                cancel=cancel,
+            )
+
+        def on_done(groups):
+            self.data_manager.set_duplicate_groups(groups)
+            self.log_message(f"Near-duplicates: {sum(len(group) for group in groups)} image(s) in {len(groups)} group(s)")
+            self.filter_var.set("Near-duplicates")
+            self.on_filter_selected()
+
+        self._start_background_job(self.similar_button, "Hashing", work, on_done)
+
+    def warm_preview_cache(self):
+        """Pre-generate the on-disk previews and thumbnails of the whole folder on a process pool."""
+        self.focus_set()
+        if self.data_manager is None or self.preview_cache is None:
+            return
+        paths = [self.data_manager.get_image_path(i) for i in range(len(self.data_manager.image_files))]
+
+        def work(progress, cancel):
+            return warm_cache(self.preview_cache, paths, self.program_config.get("cache_workers"), progress, cancel)
+
+        def on_done(result):
+            self.log_message(f"Preview cache: {result['decoded']} of {result['images']} image(s) cached, "
+                             f"{result['failed']} failed")
+
+        self._start_background_job(self.cache_button, "Caching", work, on_done)
+
+    def apply_labels_to_range(self):
+        """Add the selected labels to a range of images (only the filter's matches if a filter is active)."""
+        self.focus_set()
+        if self.data_manager is None or not self.data_manager.image_files:
+            return
+        labels = sorted(self.selected_labels)
+        if not labels:
+            self.log_message("Select the labels to apply first", "warning")
+            return
+        self.save_current_annotation()
+        current = self.data_manager.current_index
+        # Default to the current near-duplicate group, else the current image
+        group = self.data_manager.group_of(current) or [current]
+        text = simpledialog.askstring(
+            "Apply labels",
+            f"Add {', '.join(labels)} to images (e.g. 10-250):",
+            initialvalue=f"{group[0] + 1}-{group[-1] + 1}",
+            parent=self,
+        )
+        if not text:
+            return
+        try:
+            first, _, last = text.partition("-")
+            start, end = int(first) - 1, int(last or first)
+        except ValueError:
+            self.log_message(f"Not a range: '{text}'", "warning")
+            return
+        positions = self.data_manager.select(start, end, filter_key=self._filter_key())
+        changed = self.data_manager.bulk_update(positions, add_labels=labels)
+        self.log_message(f"Added {', '.join(labels)} to {changed} of {len(positions)} image(s) ({start + 1}-{end})")
+        if self.filmstrip is not None:
+            self.filmstrip.refresh()
+        self._update_progress()
 
     def undo_last_action(self, event=None):
         # TODO: Implement undo functionality
         pass
 
-    def log_message(self, message):
+    def log_message(self, message, level="info"):
+        self.session_log.log(message, level)
+
+    def _append_log_line(self, line, dropped):
         self.log_text.configure(state=tk.NORMAL)
-        self.log_text.insert(tk.END, message + "\n")
+        if dropped:
+            self.log_text.delete("1.0", "2.0")  # Keep the widget as short as the ring buffer
+        self.log_text.insert(tk.END, line + "\n")
         self.log_text.see(tk.END)
         self.log_text.configure(state=tk.DISABLED)
 
@@ -463,6 +1132,7 @@ class AnnotationUI(tk.Tk):
 
     def toggle_label(self, label, key):
         """Toggle label, then add or remove its option rows."""
+        self._end_scrub()  # Label the image that is shown, not the last fully loaded one
         if label in self.selected_labels:
             self.selected_labels.remove(label)
             self._remove_desc_options(label)
@@ -471,26 +1141,41 @@ class AnnotationUI(tk.Tk):
             self._add_desc_options(label)
         self.refresh_label_buttons()
         self.save_current_annotation()
+        if self.data_manager is None:
+            return
+        if self.filmstrip is not None:
+            self.filmstrip.refresh(self.data_manager.current_index)
+        if self._filter_key() is not None:
+            self._update_progress()  # Match count may have changed
 
-    def _add_desc_options(self, label):
-        """Append this label’s option‐rows at the bottom of the container."""
+    def _build_desc_option_rows(self, label):
+        """Create (unpacked) option-row Frames for a label; reused for every image."""
         phrases_map = self.data_config.get("common_phrases", {})
         sep = self.data_config.get("seperator", "")
         frames = []
         for row in phrases_map.get(label, []):
             rf = ttk.Frame(self.desc_options_container)
-            rf.pack(fill=tk.X, pady=(2,0))
             for opt in row:
                 btn = ttk.Button(rf, text=opt,
                                  command=lambda o=opt, s=sep: self.append_desc_option(o, s))
                 btn.pack(side=tk.LEFT, padx=2)
             frames.append(rf)
+        self.desc_option_rows[label] = frames
+        return frames
+
+    def _add_desc_options(self, label):
+        """Append this label’s option‐rows at the bottom of the container."""
+        frames = self.desc_option_rows.get(label)
+        if frames is None:
+            frames = self._build_desc_option_rows(label)
+        for rf in frames:
+            rf.pack(fill=tk.X, pady=(2,0))
         self.desc_option_frames[label] = frames
 
     def _remove_desc_options(self, label):
-        """Destroy Frames for that label’s options (when deselected)."""
+        """Hide the Frames for that label’s options (when deselected)."""
         for rf in self.desc_option_frames.pop(label, []):
-            rf.destroy()
+            rf.pack_forget()
 
     def on_label_click(self, label, key):
         # Handle label button click
@@ -505,45 +1190,49 @@ class AnnotationUI(tk.Tk):
             label, label_key = self.label_key_map[key]
             self.toggle_label(label, label_key)
 
+    def _ordered_labels(self):
+        """Selected labels: those already on the entry in their stored order, then new ones in button order."""
+        labels = [label for label in self.shown_labels if label in self.selected_labels]
+        labels += [label for _, label, _, _ in self.label_buttons
+                   if label in self.selected_labels and label not in labels]
+        return labels
+
     def save_current_annotation(self):
         annotation = {
             "description": self.desc_entry.get(),
-            "labels": list(self.selected_labels)
+            "labels": self._ordered_labels()
         }
+        if self.data_manager is None:
+            # Still loading: keep edits to the early image until the store is available
+            if self._early_image is not None:
+                self._early_annotation = annotation
+            return
+        if self._scrubbing:
+            # The entry and labels still belong to the image loaded before the scrub
+            self.data_manager.set_annotation(self._scrub_origin, annotation)
+            return
         self.data_manager.set_current_annotation(annotation)
 
+    @profiler.timed("update_desc_options")
     def update_desc_options(self):
         """
         For each selected label, inject its option-rows under the entry.
         Then adjust container height to show all rows, but at least reserve rows.
         """
-        # clear old
-        for child in self.desc_options_container.winfo_children():
-            child.destroy()
-        self.desc_option_frames.clear()
-
-        phrases_map = self.data_config.get("common_phrases", {})
-        sep = self.data_config.get("seperator", "")
+        # Rows are pooled: consecutive images with the same labels need no widget changes
+        if set(self.desc_option_frames) != self.selected_labels:
+            for label in list(self.desc_option_frames):
+                self._remove_desc_options(label)
+            for label in self.selected_labels:
+                self._add_desc_options(label)
 
-        total_rows = 0
-        # add new rows for each selected label
-        for label in self.selected_labels:
-            rows = phrases_map.get(label, [])
-            for row in rows:
-                rf = ttk.Frame(self.desc_options_container)
-                rf.pack(fill=tk.X, pady=(2,0))
-                for opt in row:
-                    btn = ttk.Button(rf, text=opt,
-                                     command=lambda o=opt: self.append_desc_option(o, sep))
-                    btn.pack(side=tk.LEFT, padx=2)
-                total_rows += 1
-                # store if later removal per-label needed
-                self.desc_option_frames.setdefault(label, []).append(rf)
+        total_rows = sum(len(frames) for frames in self.desc_option_frames.values())
 
         # compute new container height
         display_rows = max(total_rows, self.desc_reserve)
         new_height = display_rows * self.desc_row_height
-        self.desc_options_container.configure(height=new_height)
+        if new_height != self.desc_options_container.winfo_reqheight():
+            self.desc_options_container.configure(height=new_height)
 
     def append_desc_option(self, option_text, separator=""):
         """
@@ -561,10 +1250,12 @@ class AnnotationUI(tk.Tk):
             idx = int(float(value)) - 1
         except ValueError:
             return
+        if self.data_manager is None or not self.data_manager.image_files:
+            return
         idx = max(0, min(idx, len(self.data_manager.image_files)-1))
         if idx != self.data_manager.current_index:
-            self.data_manager.current_index = idx
-            self.load_image()
+            # Dragging passes many images; only preview them until the slider settles
+            self._scrub_to(idx)
 
     def on_index_entry(self, event=None):
         """Called when the user presses Enter in the index entry."""
@@ -573,7 +1264,7 @@ class AnnotationUI(tk.Tk):
         except (ValueError, TypeError):
             return "break"
         idx = val - 1
-        if 0 <= idx < len(self.data_manager.image_files):
+        if self.data_manager is not None and 0 <= idx < len(self.data_manager.image_files):
             self.data_manager.current_index = idx
             self.load_image()
         # prevent the root <Return> binding from also firing
@@ -587,7 +1278,7 @@ class AnnotationUI(tk.Tk):
             return
             
         # Check if fit_zoom_factor is available
-        if not hasattr(self, 'fit_zoom_factor') or not hasattr(self, 'current_image'):
+        if not hasattr(self, 'fit_zoom_factor') or getattr(self, 'current_image', None) is None:
             return
         
         # Calculate new zoom factor based on scrollbar percentage
@@ -626,42 +1317,131 @@ class AnnotationUI(tk.Tk):
                 self.image_x = -(new_offset_x)
                 self.image_y = -(new_offset_y)
             
-            # Safely call _show_image using the class name to avoid attribute errors
-            try:
-                self._show_image()
-            except AttributeError:
-                # As a fallback, try to call the method directly from the class
-                AnnotationUI._show_image(self)
-
-    def _show_image(self):
-        """Display the image with the current zoom factor and pan position."""
-        if not hasattr(self, 'current_image'):
+            self._request_render()
+
+    def _request_render(self):
+        """Coalesce interactive updates into one cheap render per frame, then refine once idle."""
+        if self._frame_job is None:
+            self._frame_job = self.after(self.render_frame_ms, self._render_frame)
+        self._schedule_refine()
+
+    def _schedule_refine(self):
+        """(Re)start the idle timer for the high-quality pass."""
+        if self._refine_job is not None:
+            self.after_cancel(self._refine_job)
+        self._refine_job = self.after(self.refine_delay_ms, self._show_image)
+
+    def _cancel_render_jobs(self):
+        for job in (self._frame_job, self._refine_job):
+            if job is not None:
+                self.after_cancel(job)
+        self._frame_job = None
+        self._refine_job = None
+
+    def _render_frame(self):
+        self._frame_job = None
+        self._show_image(interactive=True)
+
+    def _translate_rendered(self, dx, dy):
+        """
+        Move the current image item by (dx, dy).
+        :return: True if the moved item still covers the visible part of the image.
+        """
+        if self.image_id is None or self._rendered_rect is None or self._rendered_zoom != self.zoom_factor:
+            return False
+        self.canvas.move(self.image_id, dx, dy)
+        left, top, right, bottom = self._rendered_rect
+        self._rendered_rect = (left + dx, top + dy, right + dx, bottom + dy)
+
+        viewport = self._compute_viewport(*self._canvas_size())
+        if viewport is None:
+            return True
+        _, (width, height), (x, y) = viewport
+        left, top, right, bottom = self._rendered_rect
+        return left <= x and top <= y and right >= x + width and bottom >= y + height
+
+    def _show_image(self, interactive=False):
+        """
+        Display the image with the current zoom factor and pan position.
+        Interactive renders use a cheap filter and cover a margin around the
+        viewport so that small pans can be handled by moving the item.
+        """
+        if not interactive:
+            self._cancel_render_jobs()
+        if not hasattr(self, 'current_image') or self.current_image is None:
             return
-        
-        # Create a copy of the image to avoid modifying the original
-        img_width, img_height = self.current_image.size
-        # Calculate the new size based on zoom factor
-        new_width = int(img_width * self.zoom_factor)
-        new_height = int(img_height * self.zoom_factor)
-        
-        # Resize the image
-        if new_width > 0 and new_height > 0:  # Prevent zero-size image errors
-            # Use LANCZOS for high-quality downsampling/upsampling
-            resized_img = self.current_image.resize((new_width, new_height), Image.LANCZOS)
-            self.tk_image = ImageTk.PhotoImage(resized_img)
-            
-            # Calculate canvas center
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            
-            # Center position with offset for panning
-            x_position = (canvas_width - new_width) / 2 + self.image_x
-            y_position = (canvas_height - new_height) / 2 + self.image_y
-            
-            # Delete all existing items and create new image
+
+        canvas_width, canvas_height = self._canvas_size()
+        margin = (int(canvas_width * self.pan_margin), int(canvas_height * self.pan_margin)) if interactive else (0, 0)
+        viewport = self._compute_viewport(canvas_width, canvas_height, margin)
+
+        # Nothing to draw if the image is panned out of view
+        if viewport is None:
             self.canvas.delete("all")
-            self.image_id = self.canvas.create_image(x_position, y_position, anchor="nw", image=self.tk_image)
-    
+            self.image_id = None
+            self._rendered_rect = None
+            return
+        box, size, position = viewport
+
+        # Only resample the part of the source that is under the canvas, so the
+        # cost of a frame depends on the canvas size instead of the zoom level.
+        # The pyramid starts from the nearest downscaled level and reuses recent outputs.
+        # Use LANCZOS for high-quality downsampling/upsampling, BILINEAR while interacting
+        if interactive:
+            resized_img = self.image_pyramid.render(box, size, Image.BILINEAR, store=False, allow_load=False)
+        else:
+            resized_img = self.image_pyramid.render(box, size, Image.LANCZOS)
+        with profiler.timer("create_image"):
+            self.tk_image = ImageTk.PhotoImage(resized_img)
+
+            # Reuse the canvas item instead of deleting and recreating it
+            if self.image_id is None:
+                self.image_id = self.canvas.create_image(position[0], position[1], anchor="nw", image=self.tk_image)
+            else:
+                self.canvas.itemconfigure(self.image_id, image=self.tk_image)
+                self.canvas.coords(self.image_id, position[0], position[1])
+        self._rendered_rect = (position[0], position[1], position[0] + size[0], position[1] + size[1])
+        self._rendered_zoom = self.zoom_factor
+        self._rendered_fine = not interactive
+
+    def _compute_viewport(self, canvas_width, canvas_height, margin=(0, 0)):
+        """
+        Map the canvas viewport (grown by `margin` pixels on each side) back onto the source image.
+        :return: (source box, output size, canvas position) of the visible region,
+                 or None if no part of the image is visible.
+        """
+        img_width, img_height = self.image_pyramid.size  # Full resolution, even for reduced decodes
+        zoom = self.zoom_factor
+        # Size of the whole zoomed image (never materialised)
+        scaled_width = int(img_width * zoom)
+        scaled_height = int(img_height * zoom)
+        if scaled_width <= 0 or scaled_height <= 0:  # Prevent zero-size image errors
+            return None
+
+        # Top-left corner of the zoomed image: centered, with offset for panning
+        # (snapped to whole pixels, as the canvas would do anyway)
+        origin_x = round((canvas_width - scaled_width) / 2 + self.image_x)
+        origin_y = round((canvas_height - scaled_height) / 2 + self.image_y)
+
+        # Visible part of the zoomed image, in canvas coordinates
+        left = max(origin_x, -margin[0])
+        top = max(origin_y, -margin[1])
+        right = min(origin_x + scaled_width, canvas_width + margin[0])
+        bottom = min(origin_y + scaled_height, canvas_height + margin[1])
+        if right <= left or bottom <= top:
+            return None
+
+        # Same region in source image coordinates
+        scale_x = img_width / scaled_width
+        scale_y = img_height / scaled_height
+        box = (
+            max((left - origin_x) * scale_x, 0),
+            max((top - origin_y) * scale_y, 0),
+            min((right - origin_x) * scale_x, img_width),
+            min((bottom - origin_y) * scale_y, img_height),
+        )
+        return box, (right - left, bottom - top), (left, top)
+
     def _update_zoom_scrollbar(self):
         """Update scrollbar position to match current zoom level"""
         if hasattr(self, 'zoom_scrollbar') and hasattr(self, 'fit_zoom_factor') and self.fit_zoom_factor > 0:
@@ -678,5 +1458,13 @@ class AnnotationUI(tk.Tk):
 
 
 if __name__ == "__main__":
-    app = AnnotationUI()
+    parser = argparse.ArgumentParser(description="Image annotation tool")
+    parser.add_argument(
+        "--profile", nargs="?", const="", metavar="JSON_PATH",
+        help="Time the load/decode/resize/render/save stages; print a summary on exit (and write it to JSON_PATH)",
+    )
+    multiprocessing.freeze_support()  # "Find similar" starts worker processes, also from the executable
+    args, _ = parser.parse_known_args()
+    profiler.enabled = args.profile is not None
+    app = AnnotationUI(profile_path=args.profile)
     app.mainloop()
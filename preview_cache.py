@@ -0,0 +1,225 @@
+"""
+On-disk cache of reduced decodes and thumbnails, so the first pass through a
+folder does not pay the full decode of every image.
+
+    python preview_cache.py [--config data_config.json] [--folder PATH] [--workers N] [--size 1920 1080] [--thumbnail-size 96]
+
+Entries live in `.imagelabeller_cache/` in the image folder and are keyed by
+the image's name, file size and mtime (and the preview/thumbnail size), so
+edited images are simply regenerated. Previews are the same power-of-two
+reduced decodes the viewer makes (just enough resolution to fit the given
+size), stored as JPEG; entries that keep the full resolution (images no
+larger than the preview size) or have transparency are stored as PNG, so
+the viewer never shows recompressed pixels at 100%. The warm-up runs
+on a process pool and skips entries that already exist, so an interrupted
+run resumes where it stopped. The folder can be deleted at any time.
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image, PngImagePlugin
+
+from image_loader import DecodedImage, decode_for_fit, fit_size
+
+CACHE_DIR_NAME = ".imagelabeller_cache"
+_CHUNK = 32  # Images per worker task
+
+
+class PreviewCache:
+    """Reads and writes the cache entries of one image folder."""
+    def __init__(self, data_folder, preview_size=(1920, 1080), thumb_size=96):
+        self.data_folder = data_folder
+        self.cache_dir = os.path.join(data_folder, CACHE_DIR_NAME)
+        self.preview_size = tuple(preview_size)
+        self.thumb_size = thumb_size
+
+    def _entry_base(self, path, kind, extent):
+        """Entry path without extension, or None if the image cannot be stat'ed."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        name = os.path.relpath(path, self.data_folder)
+        key = f"{name}\0{st.st_size}\0{st.st_mtime}\0{kind}\0{extent}".encode("utf-8")
+        digest = hashlib.sha1(key).hexdigest()
+        return os.path.join(self.cache_dir, kind, digest[:2], digest)
+
+    @staticmethod
+    def _read(base, canvas_size=None):
+        """
+        (image, full size) of an entry, or None if it does not exist. With a
+        `canvas_size`, a JPEG entry is decoded at the lowest resolution that
+        still covers the fit view (draft mode).
+        """
+        for extension in (".jpg", ".png"):
+            try:
+                with Image.open(base + extension) as img:
+                    comment = img.info.get("comment", b"")
+                    if isinstance(comment, bytes):
+                        comment = comment.decode("ascii", "replace")
+                    try:
+                        full_size = tuple(int(v) for v in comment.split("x"))
+                    except ValueError:
+                        return None
+                    if canvas_size:
+                        size = fit_size(full_size, canvas_size)
+                        if size[0] > 0 and size[1] > 0:
+                            img.draft(None, size)
+                    img.load()
+            except (OSError, ValueError):
+                continue
+            return img, full_size
+        return None
+
+    @staticmethod
+    def _write(base, image, full_size):
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        comment = f"{full_size[0]}x{full_size[1]}"
+        # A full-resolution entry stands in for the original at every zoom, so it must be lossless
+        if image.mode == "RGB" and image.size != tuple(full_size):
+            path = base + ".jpg"
+            options = {"format": "JPEG", "quality": 92, "comment": comment}
+        else:
+            path = base + ".png"
+            info = PngImagePlugin.PngInfo()
+            info.add_text("comment", comment)
+            options = {"format": "PNG", "pnginfo": info}
+        # Written under a temporary name so an interrupted warm-up never leaves a torn entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        image.save(tmp_path, **options)
+        os.replace(tmp_path, path)
+
+    def load_preview(self, path, canvas_size=None):
+        """
+        DecodedImage for `path` from the cache (with its fit view for
+        `canvas_size` rendered), or None if there is no entry or it has less
+        resolution than the fit view needs.
+        """
+        base = self._entry_base(path, "preview", "x".join(map(str, self.preview_size)))
+        entry = self._read(base, canvas_size) if base is not None else None
+        if entry is None:
+            return None
+        image, full_size = entry
+        if not canvas_size or min(canvas_size) <= 1:
+            return DecodedImage(path, image, full_size)
+        size = fit_size(full_size, canvas_size)
+        if size[0] <= 0 or size[1] <= 0:
+            return DecodedImage(path, image, full_size)
+        if image.size != full_size and (image.width < size[0] or image.height < size[1]):
+            return None  # Canvas larger than the cached previews
+        preview = image if image.size == size else image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+        return DecodedImage(path, image, full_size, preview, canvas_size)
+
+    def load_thumbnail(self, path, max_size):
+        """Cached thumbnail of `path`, or None."""
+        base = self._entry_base(path, "thumbnail", max_size)
+        entry = self._read(base) if base is not None else None
+        return entry[0] if entry is not None else None
+
+    def warm(self, path):
+        """Create the missing entries of `path`; returns True if anything was decoded."""
+        preview_base = self._entry_base(path, "preview", "x".join(map(str, self.preview_size)))
+        thumb_base = self._entry_base(path, "thumbnail", self.thumb_size)
+        if preview_base is None:
+            return False
+        need_preview = not any(os.path.exists(preview_base + ext) for ext in (".jpg", ".png"))
+        need_thumb = self.thumb_size and not any(os.path.exists(thumb_base + ext) for ext in (".jpg", ".png"))
+        if not need_preview and not need_thumb:
+            return False
+        image, full_size = decode_for_fit(path, self.preview_size)
+        if need_preview:
+            self._write(preview_base, image, full_size)
+        if need_thumb:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((self.thumb_size, self.thumb_size), Image.BILINEAR, reducing_gap=2.0)
+            self._write(thumb_base, thumbnail, full_size)
+        return True
+
+
+def _warm_chunk(cache_args, paths):
+    """Worker task: warm `paths`; returns (decoded, failed) counts."""
+    cache = PreviewCache(*cache_args)
+    decoded = failed = 0
+    for path in paths:
+        try:
+            decoded += cache.warm(path)
+        except Exception:  # Any decoder error (including Image.DecompressionBombError) only fails this image
+            failed += 1  # Reported by the viewer when the image is opened
+    return decoded, failed
+
+
+def warm_cache(cache, paths, max_workers=None, progress=None, cancel=None):
+    """
+    Generate the missing previews and thumbnails of `paths` across
+    `max_workers` processes (default: all cores).
+    :param progress: called as progress(done, total) as chunks finish
+    :param cancel: threading.Event; when set, stops after the chunks in progress
+    :return: {"images", "decoded", "failed"}
+    """
+    paths = list(paths)
+    total = len(paths)
+    result = {"images": total, "decoded": 0, "failed": 0}
+    if progress:
+        progress(0, total)
+    cache_args = (cache.data_folder, cache.preview_size, cache.thumb_size)
+    done = 0
+    # spawn: the UI process has threads (Tk, prefetcher), which fork does not copy safely
+    pool = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = {pool.submit(_warm_chunk, cache_args, paths[i:i + _CHUNK]): min(_CHUNK, total - i)
+                   for i in range(0, total, _CHUNK)}
+        for future in as_completed(futures):
+            if cancel is not None and cancel.is_set():
+                break
+            decoded, failed = future.result()
+            result["decoded"] += decoded
+            result["failed"] += failed
+            done += futures[future]
+            if progress:
+                progress(done, total)
+    finally:
+        pool.shutdown(cancel_futures=True)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate previews and thumbnails for an image folder.")
+    parser.add_argument("--config", default="data_config.json", help="DataConfig file")
+    parser.add_argument("--program-config", default="program_config.json",
+                        help="ProgramConfig file (for preview_cache_size and thumbnail_size)")
+    parser.add_argument("--folder", help="Image folder (defaults to folder_path from the config)")
+    parser.add_argument("--workers", type=int, help="Processes to use (default: all cores)")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("W", "H"), help="Size the previews must fit")
+    parser.add_argument("--thumbnail-size", type=int, help="Thumbnail edge length (0 for none)")
+    args = parser.parse_args(argv)
+
+    from config import DataConfig, ProgramConfig
+    from folder_scan import MANIFEST_NAME, scan_images
+    data_config = DataConfig(args.config) if args.folder is None else None
+    program_config = ProgramConfig(args.program_config) if os.path.exists(args.program_config) else {}
+    folder = args.folder or data_config.get("folder_path", "")
+    recursive = data_config.get("recursive", False) if data_config else False
+    image_files, _ = scan_images(folder, recursive, os.path.join(folder, MANIFEST_NAME))
+
+    cache = PreviewCache(
+        folder,
+        args.size or program_config.get("preview_cache_size", (1920, 1080)),
+        args.thumbnail_size if args.thumbnail_size is not None else program_config.get("thumbnail_size", 96),
+    )
+
+    def progress(done, total):
+        print(f"\rCaching {done}/{total}", end="" if done < total else "\n", file=sys.stderr, flush=True)
+
+    result = warm_cache(cache, [os.path.join(folder, name) for name in image_files], args.workers, progress)
+    print(f"{result['decoded']} of {result['images']} images decoded, "
+          f"{result['images'] - result['decoded'] - result['failed']} already cached, {result['failed']} failed")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
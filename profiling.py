@@ -0,0 +1,117 @@
+import collections
+import functools
+import json
+import threading
+import time
+
+
+class StageStats:
+    """Durations of one stage: all-time count/total/max plus the most recent samples for percentiles"""
+    def __init__(self, max_samples=4096):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = collections.deque(maxlen=max_samples)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    def summary(self):
+        """Milliseconds, rounded for display."""
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(0.50) * 1000, 2),
+            "p95_ms": round(self.percentile(0.95) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "total_ms": round(self.total * 1000, 1),
+        }
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("profiler", "stage", "start")
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Per-stage timing of the hot paths. Disabled by default, in which case
+    timer() and timed() cost one attribute check. Safe to use from the
+    prefetch / writer threads.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def timer(self, stage):
+        """Context manager recording the time spent in the block under `stage`."""
+        return _Timer(self, stage) if self.enabled else _NULL_TIMER
+
+    def timed(self, stage):
+        """Decorator form of timer()."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, stage, seconds):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.add(seconds)
+
+    def summary(self):
+        with self._lock:
+            return {stage: stats.summary() for stage, stats in self.stages.items()}
+
+    def report(self):
+        """Plain-text table of the summary."""
+        lines = [f"{'stage':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for stage, s in sorted(self.summary().items()):
+            lines.append(f"{stage:<22}{s['count']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['max_ms']:>10}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+# Shared by all modules; main.py enables it with --profile
+profiler = Profiler()
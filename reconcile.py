@@ -0,0 +1,127 @@
+"""
+Headless consistency check between annotations and the image folder.
+
+    python reconcile.py [--config data_config.json] [--folder PATH] [--fix]
+
+Reports (and with --fix repairs) annotation entries for images that no longer
+exist, images without an entry, labels not defined in `label_groups`, and an
+out-of-range `last_index`. Labels are only checked when `label_groups` lists
+some. Without --fix nothing in the data folder is written. Does not import
+tkinter, so it can run from cron.
+Exits with status 1 if problems were found and not fixed.
+"""
+import argparse
+import sys
+
+from config import DataConfig
+from data_manager import DataManager
+
+
+class Reconciler:
+    """
+    Finds and optionally fixes inconsistencies in one DataManager. With no
+    known labels, labels are not checked (every label would look unknown).
+    """
+    def __init__(self, data_manager, label_groups, report_limit=20, out=sys.stdout):
+        self.data_manager = data_manager
+        self.known_labels = {label for group in label_groups for label in group}
+        self.report_limit = report_limit
+        self.out = out
+        self.counts = {"orphans": 0, "missing": 0, "unknown_labels": 0, "last_index": 0}
+
+    def report(self, kind, message):
+        self.counts[kind] += 1
+        if self.counts[kind] <= self.report_limit:
+            print(f"{kind}: {message}", file=self.out)
+        elif self.counts[kind] == self.report_limit + 1:
+            print(f"{kind}: ... (further entries not listed)", file=self.out)
+
+    def run(self, fix=False):
+        """Check everything; returns the number of problems found."""
+        dm = self.data_manager
+        image_set = set(dm.image_files)
+        orphans = []
+        relabel = {}
+
+        # One pass over the annotations (streamed from the store where supported)
+        seen = 0
+        for name, annotation in dm.annotations.items():
+            if name not in image_set:
+                self.report("orphans", name)
+                orphans.append(name)
+                continue
+            seen += 1
+            if not self.known_labels:
+                continue
+            labels = annotation.get("labels", [])
+            unknown = [label for label in labels if label not in self.known_labels]
+            if unknown:
+                self.report("unknown_labels", f"{name}: {', '.join(unknown)}")
+                # Other per-entry keys are kept as they are
+                relabel[name] = {**annotation, "labels": [label for label in labels if label in self.known_labels]}
+
+        missing = []
+        if seen < len(image_set):
+            for name in dm.image_files:
+                if name not in dm.annotations:
+                    self.report("missing", name)
+                    missing.append(name)
+
+        last_index_ok = 0 <= dm.current_index < max(len(dm.image_files), 1)
+        if not last_index_ok:
+            self.report("last_index", f"{dm.current_index} (have {len(dm.image_files)} images)")
+
+        total = sum(self.counts.values())
+        if fix and total:
+            for name in orphans:
+                del dm.annotations[name]
+            for name, annotation in relabel.items():
+                dm.annotations[name] = annotation
+            for name in missing:
+                dm.annotations[name] = {"description": "", "labels": []}
+            if not last_index_ok:
+                dm.current_index = max(0, min(dm.current_index, len(dm.image_files) - 1))
+            dm.save_annotations()
+        return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile annotations with the image folder.")
+    parser.add_argument("--config", default="data_config.json", help="DataConfig file")
+    parser.add_argument("--folder", help="Image folder (defaults to folder_path from the config)")
+    parser.add_argument("--fix", action="store_true", help="Repair the problems that were found")
+    parser.add_argument("--report-limit", type=int, default=20, help="Entries listed per problem kind")
+    args = parser.parse_args(argv)
+
+    data_config = DataConfig(args.config)
+    folder = args.folder or data_config.get("folder_path", "")
+    storage = data_config.get("storage", "json")
+    # A dry run must not create the database (or import annotations.json into it)
+    store_options = {"read_only": True} if storage == "sqlite" and not args.fix else {}
+    try:
+        data_manager = DataManager(
+            folder,
+            storage=storage,
+            recursive=data_config.get("recursive", False),
+            update_manifest=args.fix,
+            **store_options,
+        )
+    except FileNotFoundError as e:
+        print(f"{e} Nothing to check; open the folder in the app or run with --fix to create it.", file=sys.stderr)
+        return 1
+    try:
+        reconciler = Reconciler(data_manager, data_config.get("label_groups", []), args.report_limit)
+        if not reconciler.known_labels:
+            print("No label_groups configured: labels are not checked.", file=sys.stderr)
+        problems = reconciler.run(fix=args.fix)
+    finally:
+        # Fixes are saved by run(); a dry run must not touch the annotation files
+        data_manager.close(save=False)
+
+    summary = ", ".join(f"{kind}={count}" for kind, count in reconciler.counts.items())
+    print(f"{len(data_manager.image_files)} images checked: {summary}" + (" (fixed)" if args.fix and problems else ""))
+    return 1 if problems and not args.fix else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
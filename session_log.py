@@ -0,0 +1,83 @@
+import collections
+import itertools
+import logging
+import logging.handlers
+import queue
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps only the last `capacity` formatted records, each on one line
+    (newlines in a message become spaces). `on_emit(line, dropped)` is called
+    for each new line; `dropped` tells whether the oldest line fell out.
+    """
+    def __init__(self, capacity, on_emit=None):
+        super().__init__()
+        self.lines = collections.deque(maxlen=capacity)
+        self.on_emit = on_emit
+
+    def emit(self, record):
+        # One record per line, so a viewer can drop exactly one line per dropped record
+        line = " ".join(self.format(record).splitlines())
+        dropped = len(self.lines) == self.lines.maxlen
+        self.lines.append(line)
+        if self.on_emit is not None:
+            self.on_emit(line, dropped)
+
+
+class SessionLog:
+    """
+    Session messages with levels. The last `capacity` messages at or above
+    `level` are kept in memory for display; with `file_path`, messages at or
+    above `file_level` also go to a rotating log file, written by a background
+    thread so logging never waits on disk.
+    """
+    _ids = itertools.count()
+
+    def __init__(self, capacity=500, level="info", file_path=None, file_level="debug",
+                 max_file_bytes=5 * 1024 * 1024, backup_count=3, on_emit=None):
+        self.logger = logging.getLogger(f"imagelabeller.session.{next(self._ids)}")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+
+        self.buffer = RingBufferHandler(capacity, on_emit)
+        self.buffer.setLevel(LEVELS[level])
+        self.buffer.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(self.buffer)
+
+        self._listener = None
+        if file_path:
+            # delay=True: the file is opened by the listener thread on the first record
+            file_handler = logging.handlers.RotatingFileHandler(
+                file_path, maxBytes=max_file_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+            )
+            file_handler.setLevel(LEVELS[file_level])
+            file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            records = queue.SimpleQueue()
+            self.logger.addHandler(logging.handlers.QueueHandler(records))
+            self._listener = logging.handlers.QueueListener(records, file_handler, respect_handler_level=True)
+            self._listener.start()
+
+    def log(self, message, level="info"):
+        self.logger.log(LEVELS[level], message)
+
+    def lines(self):
+        """Messages currently held in memory, oldest first."""
+        return list(self.buffer.lines)
+
+    def close(self):
+        """Write out queued records and close the log file."""
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
@@ -0,0 +1,268 @@
+"""
+Multi-annotator sessions on one folder.
+
+Each instance with a `shard` section in data_config.json works on its own
+partition of the images and writes only its own shard file,
+`annotations.<annotator>.json` (plus `annotations.<annotator>.journal`), so
+instances sharing a folder never write the same file. The canonical
+annotations.json is only read by them; it is produced by the merge step:
+
+    python shards.py [--config data_config.json] [--folder PATH] [--dry-run]
+
+Conflicts (two shards holding the same image) are resolved deterministically:
+the most recent change wins, ties go to the annotator name that sorts first.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+from annotation_store import (
+    AnnotationJournal,
+    AnnotationStore,
+    JsonAnnotationStore,
+    atomic_write_json,
+    read_annotations_file,
+)
+from compact_annotations import CompactAnnotations
+from config import DataConfig
+from profiling import profiler
+
+PARTITIONS = ("hash", "range")
+_ANNOTATOR_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def shard_file(data_folder, annotator):
+    return os.path.join(data_folder, f"annotations.{annotator}.json")
+
+
+def shard_journal_file(data_folder, annotator):
+    return os.path.join(data_folder, f"annotations.{annotator}.journal")
+
+
+class ShardSpec:
+    """
+    Which images one annotator works on: partition `index` of `count`, either
+    by a hash of the image name (stable as the folder changes) or as a
+    contiguous range of the image order at startup.
+    """
+    def __init__(self, annotator, index=0, count=1, partition="hash"):
+        if not annotator or not _ANNOTATOR_RE.match(annotator):
+            raise ValueError(f"Invalid annotator name '{annotator}' (use letters, digits, '-' and '_').")
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown shard partition '{partition}'.")
+        if not 0 <= index < count:
+            raise ValueError(f"Shard index {index} is out of range for {count} shard(s).")
+        self.annotator = annotator
+        self.index = index
+        self.count = count
+        self.partition = partition
+        self._range_names = set()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the `shard` section of data_config.json (None if absent)."""
+        if not config:
+            return None
+        return cls(config.get("annotator", ""), config.get("index", 0), config.get("count", 1),
+                   config.get("partition", "hash"))
+
+    def to_dict(self):
+        return {"annotator": self.annotator, "index": self.index, "count": self.count, "partition": self.partition}
+
+    def select(self, image_files):
+        """The part of `image_files` (in order) assigned to this shard."""
+        if self.partition == "hash":
+            return [name for name in image_files if self.owns(name)]
+        start = self.index * len(image_files) // self.count
+        end = (self.index + 1) * len(image_files) // self.count
+        selected = image_files[start:end]
+        self._range_names = set(selected)
+        return selected
+
+    def owns(self, image_name):
+        """
+        Whether `image_name` belongs to this shard. With range partitions,
+        images that appear after startup belong to no shard until restart.
+        """
+        if self.partition == "range":
+            return image_name in self._range_names
+        digest = hashlib.md5(image_name.encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") % self.count == self.index
+
+
+class ShardedAnnotationStore(JsonAnnotationStore):
+    """
+    Reads the canonical annotations.json, but persists only this annotator's
+    changes (with the time of each change) to its shard file and journal.
+    """
+    def __init__(self, data_folder, shard, save_interval=2.0, labels=()):
+        super().__init__(data_folder, save_interval, labels)
+        self.shard = shard
+        self.canonical_file = self.meta_file
+        self.meta_file = shard_file(data_folder, shard.annotator)
+        self.journal = AnnotationJournal(shard_journal_file(data_folder, shard.annotator))
+        self.changed = {}  # image name -> time of this annotator's last change
+
+    def load(self, image_files, mtimes=None):
+        if os.path.exists(self.canonical_file):
+            annotations, _ = read_annotations_file(self.canonical_file)
+            self.annotations = CompactAnnotations(annotations, self._label_table())
+        else:
+            self._initialize_dataset(image_files, mtimes)
+        self.last_index = 0
+        # This annotator's own changes take precedence over the last merge
+        shard = read_shard_file(self.meta_file, self.journal)
+        if shard is not None:
+            self.annotations.update(shard["annotations"])
+            self.changed = shard["changed"]
+            self.last_index = shard["last_index"]
+
+    def put(self, image_name, annotation, last_index):
+        with self._lock:
+            if self.annotations.get(image_name) == annotation:
+                # Re-saving an unchanged entry (e.g. on a key release) is not a change
+                self.last_index = last_index
+                return
+            changed_at = time.time()
+            AnnotationStore.put(self, image_name, annotation, last_index)
+            self.changed[image_name] = changed_at
+            self.journal.append(image_name, annotation, last_index, changed_at)
+        self.writer.request()
+
+    def put_many(self, items, last_index):
+        with self._lock:
+            changed = [(name, annotation) for name, annotation in items
+                       if self.annotations.get(name) != annotation]
+            self.last_index = last_index
+            if not changed:
+                return
+            changed_at = time.time()
+            AnnotationStore.put_many(self, changed, last_index)
+            for name, _ in changed:
+                self.changed[name] = changed_at
+            self.journal.append_many((name, annotation, last_index, changed_at) for name, annotation in changed)
+        self.writer.request()
+
+    @profiler.timed("save_annotations")
+    def save(self, last_index=None):
+        """Write this annotator's changes to the shard file, compacting its journal."""
+        with self._save_lock:
+            with self._lock:
+                if last_index is not None:
+                    self.last_index = last_index
+                data = {
+                    "shard": self.shard.to_dict(),
+                    "last_index": self.last_index,
+                    "annotations": {name: self.annotations[name] for name in self.changed if name in self.annotations},
+                    "changed": dict(self.changed),
+                }
+                self.journal.rotate()
+            atomic_write_json(self.meta_file, data)
+            self.journal.discard_rotated()
+
+
+def read_shard_file(path, journal=None):
+    """
+    Read one shard file and replay its journal.
+    :return: {"annotator", "last_index", "annotations", "changed"} or None if neither exists.
+    """
+    if journal is None:
+        journal = AnnotationJournal(os.path.splitext(path)[0] + ".journal")
+    shard = None
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        shard = {
+            "annotator": data.get("shard", {}).get("annotator"),
+            "last_index": data.get("last_index", 0),
+            "annotations": data.get("annotations", {}),
+            "changed": data.get("changed", {}),
+        }
+    for record in journal.replay_records():
+        if shard is None:
+            shard = {"annotator": None, "last_index": 0, "annotations": {}, "changed": {}}
+        name = record["image"]
+        shard["annotations"][name] = record["annotation"]
+        shard["changed"][name] = record.get("time", 0)
+        shard["last_index"] = record.get("last_index", 0)
+    return shard
+
+
+def find_shard_files(data_folder):
+    """{annotator: shard file path} for every shard file or journal in the folder."""
+    found = {}
+    for pattern in ("annotations.*.json", "annotations.*.journal", "annotations.*.journal.1"):
+        for path in glob.glob(os.path.join(glob.escape(data_folder), pattern)):
+            annotator = os.path.basename(path).split(".")[1]
+            if _ANNOTATOR_RE.match(annotator):
+                found[annotator] = shard_file(data_folder, annotator)
+    return found
+
+
+def merge_shards(data_folder, write=True):
+    """
+    Fold every shard into the canonical annotations.json.
+    :return: {"shards": n, "merged": entries taken from shards, "conflicts": [(image, winner, losers)]}
+    """
+    canonical = os.path.join(data_folder, "annotations.json")
+    if os.path.exists(canonical):
+        annotations, last_index = read_annotations_file(canonical)
+    else:
+        annotations, last_index = {}, 0
+    # Edits still in the canonical journal (from sessions without a shard) are part of the base
+    canonical_journal = AnnotationJournal(os.path.join(data_folder, "annotations.journal"))
+    for name, annotation, journal_index in canonical_journal.replay():
+        annotations[name] = annotation
+        last_index = journal_index
+
+    # image -> [(time, annotator, annotation)]
+    candidates = {}
+    shard_files = find_shard_files(data_folder)
+    for annotator, path in sorted(shard_files.items()):
+        shard = read_shard_file(path, AnnotationJournal(shard_journal_file(data_folder, annotator)))
+        if shard is None:
+            continue
+        for name, annotation in shard["annotations"].items():
+            changed_at = shard["changed"].get(name, 0)
+            candidates.setdefault(name, []).append((changed_at, annotator, annotation))
+
+    conflicts = []
+    for name, entries in candidates.items():
+        # Latest change first; equal times fall back to the annotator name
+        entries.sort(key=lambda entry: (-entry[0], entry[1]))
+        annotations[name] = entries[0][2]
+        losers = [annotator for _, annotator, annotation in entries[1:] if annotation != entries[0][2]]
+        if losers:
+            conflicts.append((name, entries[0][1], losers))
+
+    if write:
+        # Compacted like JsonAnnotationStore.save: a journal left behind would replay over the merge
+        canonical_journal.rotate()
+        atomic_write_json(canonical, {"last_index": last_index, "annotations": annotations})
+        canonical_journal.discard_rotated()
+    return {"shards": len(shard_files), "merged": len(candidates), "conflicts": conflicts}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge annotator shards into annotations.json.")
+    parser.add_argument("--config", default="data_config.json", help="DataConfig file")
+    parser.add_argument("--folder", help="Image folder (defaults to folder_path from the config)")
+    parser.add_argument("--dry-run", action="store_true", help="Report conflicts without writing annotations.json")
+    args = parser.parse_args(argv)
+
+    folder = args.folder or DataConfig(args.config).get("folder_path", "")
+    result = merge_shards(folder, write=not args.dry_run)
+    for name, winner, losers in sorted(result["conflicts"]):
+        print(f"conflict: {name}: kept {winner}, dropped {', '.join(losers)}")
+    action = "Would merge" if args.dry_run else "Merged"
+    print(f"{action} {result['merged']} entries from {result['shards']} shard(s), {len(result['conflicts'])} conflict(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
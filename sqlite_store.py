@@ -0,0 +1,250 @@
+import os
+import pathlib
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+from annotation_store import AnnotationStore, JsonAnnotationStore
+from profiling import profiler
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id          INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL UNIQUE,
+    description TEXT NOT NULL DEFAULT '',
+    annotated   INTEGER NOT NULL DEFAULT 0,
+    mtime       REAL
+);
+CREATE TABLE IF NOT EXISTS labels (
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    label    TEXT NOT NULL,
+    PRIMARY KEY (image_id, label)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_labels_label ON labels(label, image_id);
+CREATE INDEX IF NOT EXISTS idx_images_annotated ON images(annotated);
+CREATE INDEX IF NOT EXISTS idx_images_mtime ON images(mtime);
+"""
+
+
+def _is_annotated(annotation):
+    return bool(annotation.get("labels") or annotation.get("description"))
+
+
+class SqliteAnnotations(MutableMapping):
+    """Dict-shaped view of the images/labels tables; every access is an indexed point query."""
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __getitem__(self, image_name):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, description FROM images WHERE name = ?", (image_name,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(image_name)
+            labels = [r[0] for r in self.conn.execute(
+                "SELECT label FROM labels WHERE image_id = ?", (row[0],)
+            )]
+        return {"description": row[1], "labels": labels}
+
+    def __setitem__(self, image_name, annotation):
+        with self.lock, self.conn:
+            self._write(image_name, annotation)
+
+    def _write(self, image_name, annotation, mtime=None):
+        """Upsert one image and replace its labels (caller holds the lock and the transaction)."""
+        self.conn.execute(
+            "INSERT INTO images (name, description, annotated, mtime) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET description = excluded.description, "
+            "annotated = excluded.annotated, mtime = COALESCE(excluded.mtime, images.mtime)",
+            (image_name, annotation.get("description", ""), int(_is_annotated(annotation)), mtime),
+        )
+        image_id = self.conn.execute("SELECT id FROM images WHERE name = ?", (image_name,)).fetchone()[0]
+        self.conn.execute("DELETE FROM labels WHERE image_id = ?", (image_id,))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO labels (image_id, label) VALUES (?, ?)",
+            [(image_id, label) for label in annotation.get("labels", [])],
+        )
+
+    def __delitem__(self, image_name):
+        with self.lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM images WHERE name = ?", (image_name,))
+        if cursor.rowcount == 0:
+            raise KeyError(image_name)
+
+    def __contains__(self, image_name):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM images WHERE name = ?", (image_name,)
+            ).fetchone() is not None
+
+    def __iter__(self):
+        with self.lock:
+            names = [r[0] for r in self.conn.execute("SELECT name FROM images ORDER BY id")]
+        return iter(names)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def items(self, chunk_size=1000):
+        """Yield (image_name, annotation) for all images, a chunk of rows at a time."""
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT id, name, description FROM images WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, chunk_size),
+                ).fetchall()
+                if not rows:
+                    return
+                labels = {}
+                for image_id, label in self.conn.execute(
+                    "SELECT image_id, label FROM labels WHERE image_id BETWEEN ? AND ?",
+                    (rows[0][0], rows[-1][0]),
+                ):
+                    labels.setdefault(image_id, []).append(label)
+            for image_id, name, description in rows:
+                yield name, {"description": description, "labels": labels.get(image_id, [])}
+            last_id = rows[-1][0]
+
+    def update_many(self, items, mtimes=None):
+        """Write many (image_name, annotation) pairs in a single transaction."""
+        mtimes = mtimes or {}
+        with self.lock, self.conn:
+            for image_name, annotation in items:
+                self._write(image_name, annotation, mtimes.get(image_name))
+
+    # Queries used by AnnotationIndex.rebuild, so filtered navigation does not read every row
+
+    def label_names(self):
+        """Every label in use (a scan of the label index only)."""
+        with self.lock:
+            return [r[0] for r in self.conn.execute("SELECT DISTINCT label FROM labels")]
+
+    def names_with_label(self, label):
+        """Image names carrying `label` (uses the label index)."""
+        with self.lock:
+            return [r[0] for r in self.conn.execute(
+                "SELECT images.name FROM labels JOIN images ON images.id = labels.image_id "
+                "WHERE labels.label = ?", (label,)
+            )]
+
+    def unannotated_names(self):
+        """Image names with neither labels nor a description (uses the annotated index)."""
+        with self.lock:
+            return [r[0] for r in self.conn.execute("SELECT name FROM images WHERE annotated = 0")]
+
+    def annotated_names(self):
+        """(image name, has a description) for images with labels or a description (uses the annotated index)."""
+        with self.lock:
+            return [(r[0], bool(r[1])) for r in self.conn.execute(
+                "SELECT name, description != '' FROM images WHERE annotated = 1"
+            )]
+
+
+class SqliteAnnotationStore(AnnotationStore):
+    """
+    Annotations in annotations.sqlite3 inside the data folder. Reads and writes
+    are indexed point queries; each change is its own transaction. The first
+    open imports an existing annotations.json (either format, plus journal).
+    With read_only, an existing database is opened for reading only (nothing
+    is created or imported).
+    """
+    def __init__(self, data_folder, db_name="annotations.sqlite3", read_only=False):
+        super().__init__(data_folder)
+        self.db_file = os.path.join(data_folder, db_name)
+        self.read_only = read_only
+        if read_only:
+            if not os.path.exists(self.db_file):
+                raise FileNotFoundError(f"No annotation database at '{self.db_file}'.")
+            uri = pathlib.Path(os.path.abspath(self.db_file)).as_uri() + "?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            # Also used from background threads (e.g. startup), serialised by the lock
+            self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("PRAGMA foreign_keys=ON")
+            self.conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self.annotations = SqliteAnnotations(self.conn, self._lock)
+
+    def load(self, image_files, mtimes=None):
+        if len(self.annotations) == 0 and not self.read_only:
+            json_store = JsonAnnotationStore(self.data_folder)
+            if os.path.exists(json_store.meta_file) or os.path.exists(json_store.journal.journal_path):
+                self.import_json(json_store, image_files, mtimes)
+            else:
+                self._initialize_dataset(image_files, mtimes)
+                self._set_meta("last_index", 0)
+        self.last_index = int(self._get_meta("last_index", 0))
+
+    def _initialize_dataset(self, image_files, mtimes=None):
+        empty = {"description": "", "labels": []}
+        self.annotations.update_many(((image, empty) for image in image_files), mtimes)
+
+    def import_json(self, json_store, image_files=(), mtimes=None):
+        """One-shot import of annotations.json (current or legacy format, with its journal)."""
+        json_store.load(image_files, mtimes)
+        self.annotations.update_many(json_store.annotations.items(), mtimes)
+        self._set_meta("last_index", json_store.last_index)
+
+    def add_images(self, image_names, mtimes=None):
+        mtimes = mtimes or {}
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO images (name, mtime) VALUES (?, ?)",
+                [(image, mtimes.get(image)) for image in image_names],
+            )
+
+    def remove_images(self, image_names):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM images WHERE name = ? AND annotated = 0", [(image,) for image in image_names]
+            )
+
+    def put(self, image_name, annotation, last_index):
+        with self._lock, self.conn:
+            self.annotations._write(image_name, annotation)
+            self._set_meta("last_index", last_index, commit=False)
+        self.last_index = last_index
+
+    def put_many(self, items, last_index):
+        """All of `items` in a single transaction."""
+        with self._lock, self.conn:
+            for image_name, annotation in items:
+                self.annotations._write(image_name, annotation)
+            self._set_meta("last_index", last_index, commit=False)
+        self.last_index = last_index
+
+    @profiler.timed("save_annotations")
+    def save(self, last_index=None):
+        if last_index is not None:
+            self.last_index = last_index
+        self._set_meta("last_index", self.last_index)
+
+    def close(self, last_index=None, save=True):
+        if save and not self.read_only:
+            self.save(last_index)
+        with self._lock:
+            self.conn.close()
+
+    def _get_meta(self, key, default=None):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _set_meta(self, key, value, commit=True):
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value))
+            )
+            if commit:
+                self.conn.commit()
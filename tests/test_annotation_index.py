@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_index import UNDESCRIBED, UNLABELED, AnnotationIndex, label_filter  # noqa: E402
+
+
+class AnnotationIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.image_files = ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+        self.annotations = {
+            "a.jpg": {"description": "", "labels": ["cat"]},
+            "b.jpg": {"description": "dark", "labels": []},
+            "c.jpg": {"description": "", "labels": ["cat", "dog", "cat"]},
+            "gone.jpg": {"description": "", "labels": ["dog"]},  # Not in the folder
+        }
+        self.index = AnnotationIndex()
+        self.index.rebuild(self.image_files, self.annotations)
+
+    def test_rebuild(self):
+        self.assertEqual(self.index.positions(label_filter("cat")), [0, 2])
+        self.assertEqual(self.index.positions(label_filter("dog")), [2])
+        self.assertEqual(self.index.positions(label_filter("bird")), [])
+        self.assertEqual(self.index.positions(UNLABELED), [1, 3])  # d.jpg has no entry
+        self.assertEqual(self.index.positions(UNDESCRIBED), [0, 2, 3])
+
+    def test_update_moves_one_image(self):
+        self.index.update(1, self.annotations["b.jpg"], {"description": "", "labels": ["dog"]})
+        self.assertEqual(self.index.positions(label_filter("dog")), [1, 2])
+        self.assertEqual(self.index.positions(UNLABELED), [3])
+        self.assertEqual(self.index.positions(UNDESCRIBED), [0, 1, 2, 3])
+        self.index.update(2, self.annotations["c.jpg"], {"description": "x", "labels": []})
+        self.assertEqual(self.index.positions(label_filter("cat")), [0])
+        self.assertEqual(self.index.positions(label_filter("dog")), [1])
+        self.assertEqual(self.index.positions(UNLABELED), [2, 3])
+        self.assertEqual(self.index.positions(UNDESCRIBED), [0, 1, 3])
+
+    def test_extend_indexes_appended_images(self):
+        self.image_files += ["e.jpg", "f.jpg"]
+        self.annotations["e.jpg"] = {"description": "new", "labels": ["cat"]}
+        self.index.extend(self.image_files, 4, self.annotations)
+        self.assertEqual(self.index.positions(label_filter("cat")), [0, 2, 4])
+        self.assertEqual(self.index.positions(UNLABELED), [1, 3, 5])
+        self.assertEqual(self.index.positions(UNDESCRIBED), [0, 2, 3, 5])
+
+    def test_find_next_and_rank(self):
+        cat = label_filter("cat")
+        self.assertEqual(self.index.find_next(cat, 0), 2)
+        self.assertEqual(self.index.find_next(cat, 2), 0)  # Wraps around
+        self.assertIsNone(self.index.find_next(cat, 2, wrap=False))
+        self.assertEqual(self.index.find_next(cat, 1, direction=-1), 0)
+        self.assertEqual(self.index.find_next(cat, 0, direction=-1), 2)
+        self.assertIsNone(self.index.find_next(label_filter("bird"), 0))
+        self.assertEqual(self.index.rank(cat, 2), (2, 2))
+        self.assertEqual(self.index.rank(cat, 1), (None, 2))
+
+    def test_unknown_filter(self):
+        with self.assertRaises(ValueError):
+            self.index.positions(("starred", None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_store import JsonAnnotationStore, read_annotations_file  # noqa: E402
+
+
+class AnnotationRoundTripTest(unittest.TestCase):
+    """load -> save -> reload through JsonAnnotationStore keeps every entry as it was"""
+    def test_load_save_reload_equals_input(self):
+        annotations = {
+            "a.jpg": {"description": "", "labels": []},
+            "b.jpg": {"description": "", "labels": ["cat", "dog"]},
+            "c.jpg": {"description": "two cats", "labels": ["cat"]},
+            "d.jpg": {"description": "", "labels": ["dog"], "reviewer": "alice"},
+            "e.jpg": {"description": "checked", "labels": [], "reviewer": "bob", "score": 0.5},
+        }
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "annotations.json"), 'w', encoding='utf-8') as f:
+                json.dump({"last_index": 3, "annotations": annotations}, f)
+
+            store = JsonAnnotationStore(folder)
+            store.load(list(annotations))
+            store.close()
+
+            reloaded, last_index = read_annotations_file(os.path.join(folder, "annotations.json"))
+            self.assertEqual(reloaded, annotations)
+            self.assertEqual(last_index, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
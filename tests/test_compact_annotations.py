@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_store import JsonAnnotationStore  # noqa: E402
+from compact_annotations import CompactAnnotations, LabelTable  # noqa: E402
+
+
+class CompactAnnotationsTest(unittest.TestCase):
+    def test_entries_read_back_as_stored(self):
+        entries = {
+            "a.jpg": {"description": "", "labels": ["dog", "cat"]},
+            "b.jpg": {"description": "x", "labels": ["cat", "dog"]},
+            "c.jpg": {"description": "", "labels": ["cat", "cat"]},
+            "d.jpg": {"description": "", "labels": [], "reviewer": "alice"},
+        }
+        annotations = CompactAnnotations(entries)
+        self.assertEqual(dict(annotations.items()), entries)
+        snapshot = annotations.copy()
+        annotations["a.jpg"] = {"description": "", "labels": ["cat", "dog"]}
+        self.assertEqual(snapshot["a.jpg"]["labels"], ["dog", "cat"])
+        self.assertEqual(annotations["a.jpg"]["labels"], ["cat", "dog"])
+        del annotations["b.jpg"]
+        annotations["b.jpg"] = {"description": "", "labels": ["cat", "dog"]}
+        self.assertEqual(annotations["b.jpg"]["labels"], ["cat", "dog"])
+
+    def test_seeded_table_follows_the_configured_order(self):
+        table = LabelTable(["cat", "dog", "bird"])
+        annotations = CompactAnnotations({"a.jpg": {"description": "", "labels": ["bird", "dog"]}}, table)
+        self.assertEqual(table.names, ["cat", "dog", "bird"])
+        self.assertEqual(annotations["a.jpg"]["labels"], ["bird", "dog"])
+        annotations["b.jpg"] = {"description": "", "labels": ["cat", "bird"]}
+        self.assertFalse(annotations._orders.get("b.jpg"))  # In table order: only the mask is kept
+        self.assertEqual(table.decode(annotations._masks["b.jpg"]), ["cat", "bird"])
+
+
+class JsonStoreLabelsTest(unittest.TestCase):
+    def test_store_seeds_the_table_and_keeps_file_order(self):
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "annotations.json"), 'w', encoding='utf-8') as f:
+                json.dump({"last_index": 0, "annotations": {
+                    "a.jpg": {"description": "", "labels": ["unknown", "dog"]},
+                }}, f)
+            store = JsonAnnotationStore(folder, labels=["cat", "dog"])
+            store.load(["a.jpg"])
+            store.close(save=False)
+            self.assertEqual(store.annotations.labels.names, ["cat", "dog", "unknown"])
+            self.assertEqual(store.annotations["a.jpg"]["labels"], ["unknown", "dog"])
+
+
+if __name__ == "__main__":
+    unittest.main()
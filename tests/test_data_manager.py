@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_index import UNLABELED, label_filter  # noqa: E402
+from annotation_store import read_annotations_file  # noqa: E402
+from data_manager import DataManager  # noqa: E402
+
+
+class DataManagerTestCase(unittest.TestCase):
+    """A folder with a.jpg, b.jpg, c.jpg (in that time order) and an annotations.json"""
+    annotations = {
+        "a.jpg": {"description": "", "labels": []},
+        "b.jpg": {"description": "blurry", "labels": ["cat"], "reviewer": "alice"},
+        "c.jpg": {"description": "", "labels": ["dog", "cat"]},
+    }
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        for i, name in enumerate(self.annotations):
+            path = os.path.join(self.folder, name)
+            with open(path, 'wb') as f:
+                f.write(b"x")
+            os.utime(path, (1000 + i, 1000 + i))
+        with open(os.path.join(self.folder, "annotations.json"), 'w', encoding='utf-8') as f:
+            json.dump({"last_index": 0, "annotations": self.annotations}, f)
+        self.data_manager = DataManager(self.folder)
+
+    def tearDown(self):
+        self.data_manager.close(save=False)
+        self._tmp.cleanup()
+
+    def reopen(self):
+        """Close (saving) and read annotations.json back."""
+        self.data_manager.close()
+        self.data_manager = DataManager(self.folder)
+        return read_annotations_file(os.path.join(self.folder, "annotations.json"))[0]
+
+
+class BulkUpdateTest(DataManagerTestCase):
+    def test_add_label_keeps_other_keys_and_updates_the_index(self):
+        dm = self.data_manager
+        self.assertEqual(dm.bulk_update(range(3), add_labels=["cat"]), 1)  # Only a.jpg changes
+        self.assertEqual(dm.index.positions(label_filter("cat")), [0, 1, 2])
+        self.assertEqual(dm.index.positions(UNLABELED), [])
+        saved = self.reopen()
+        self.assertEqual(saved["a.jpg"], {"description": "", "labels": ["cat"]})
+        self.assertEqual(saved["b.jpg"], self.annotations["b.jpg"])
+
+    def test_set_labels_and_append_description(self):
+        dm = self.data_manager
+        self.assertEqual(dm.bulk_update([1], set_labels=["dog"], append_description=", dark"), 1)
+        self.assertEqual(dm.annotations["b.jpg"],
+                         {"description": "blurry, dark", "labels": ["dog"], "reviewer": "alice"})
+        self.assertEqual(dm.index.positions(label_filter("cat")), [2])
+
+    def test_remove_label_on_filtered_selection(self):
+        dm = self.data_manager
+        positions = dm.select(filter_key=label_filter("cat"))
+        self.assertEqual(positions, [1, 2])
+        self.assertEqual(dm.bulk_update(positions, remove_labels=["cat"]), 2)
+        self.assertEqual(dm.index.positions(label_filter("cat")), [])
+        self.assertEqual(dm.index.positions(UNLABELED), [0, 1])
+        self.assertEqual(self.reopen()["c.jpg"], {"description": "", "labels": ["dog"]})
+
+    def test_no_op_writes_nothing(self):
+        dm = self.data_manager
+        self.assertEqual(dm.bulk_update(range(3), remove_labels=["bird"]), 0)
+        self.assertEqual(dm.bulk_update([0], set_description=""), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "annotations.journal")))
+
+
+class ScrubEditTest(DataManagerTestCase):
+    """Edits made around a scrub go to the image the annotation widgets show"""
+    def make_ui(self):
+        import main
+        ui = mock.Mock()
+        for name in ("_scrub_to", "save_current_annotation", "_ordered_labels"):
+            setattr(ui, name, getattr(main.AnnotationUI, name).__get__(ui))
+        ui.data_manager = self.data_manager
+        ui._scrubbing = False
+        ui._scrub_frame_job = None
+        ui._scrub_settle_job = None
+        ui.label_buttons = [(None, "cat", "c", "#fff"), (None, "dog", "d", "#fff")]
+        ui.desc_entry.get.return_value = ""
+        ui.shown_labels = []
+        ui.selected_labels = set()
+        return ui
+
+    def test_set_annotation_keeps_the_current_index(self):
+        dm = self.data_manager
+        dm.current_index = 2
+        dm.set_annotation(0, {"description": "", "labels": ["cat"]})
+        self.assertEqual(dm.annotations["a.jpg"]["labels"], ["cat"])
+        self.assertEqual(dm.index.positions(label_filter("cat")), [0, 1, 2])
+        self.assertEqual(dm.store.last_index, 2)
+
+    def test_edits_before_and_during_a_scrub_are_kept(self):
+        ui = self.make_ui()
+        self.data_manager.current_index = 0
+        ui.desc_entry.get.return_value = "typed before"
+        ui._scrub_to(1)
+        self.assertEqual(self.data_manager.annotations["a.jpg"]["description"], "typed before")
+        ui._scrub_to(2)
+        ui.desc_entry.get.return_value = "typed during"
+        ui.selected_labels = {"dog"}
+        ui.save_current_annotation()
+        self.assertEqual(self.data_manager.current_index, 2)
+        self.assertEqual(self.data_manager.annotations["a.jpg"], {"description": "typed during", "labels": ["dog"]})
+        self.assertEqual(self.data_manager.annotations["c.jpg"], self.annotations["c.jpg"])
+
+
+if __name__ == "__main__":
+    unittest.main()
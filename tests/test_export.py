@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import export  # noqa: E402
+from annotation_store import AnnotationJournal, atomic_write_annotations  # noqa: E402
+
+ANNOTATIONS = {
+    "a.jpg": {"description": "", "labels": []},
+    "b.jpg": {"description": "two \"cats\", {braces}", "labels": ["cat", "dog"]},
+    "ç/ü.jpg": {"description": "ünïcode", "labels": ["cat"], "score": 12345.675},
+}
+
+
+class StreamingParserTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.meta_file = os.path.join(self._tmp.name, "annotations.json")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, data, indent=None):
+        with open(self.meta_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+
+    def read(self):
+        return list(export.iter_annotation_file(self.meta_file))
+
+    def test_both_formats_across_chunk_boundaries(self):
+        for data in ({"last_index": 12345, "annotations": ANNOTATIONS}, ANNOTATIONS,
+                     {"annotations": ANNOTATIONS, "last_index": 2}):
+            for indent in (None, 2):
+                self.write(data, indent)
+                for chunk_size in (1, 3, 7, export.CHUNK_SIZE):
+                    with mock.patch.object(export, "CHUNK_SIZE", chunk_size):
+                        self.assertEqual(self.read(), list(ANNOTATIONS.items()), (indent, chunk_size))
+
+    def test_file_written_by_the_store(self):
+        atomic_write_annotations(self.meta_file, ANNOTATIONS, 4)
+        with mock.patch.object(export, "CHUNK_SIZE", 5):
+            self.assertEqual(self.read(), list(ANNOTATIONS.items()))
+
+    def test_empty_annotations(self):
+        self.write({"last_index": 0, "annotations": {}})
+        self.assertEqual(self.read(), [])
+        self.write({})
+        self.assertEqual(self.read(), [])
+
+    def test_malformed_file(self):
+        with open(self.meta_file, 'w', encoding='utf-8') as f:
+            f.write('{"annotations": {"a.jpg": {"labels": []}')
+        with self.assertRaises(ValueError):
+            self.read()
+
+    def test_journal_edits_are_applied(self):
+        self.write({"last_index": 0, "annotations": ANNOTATIONS})
+        journal = AnnotationJournal(os.path.join(self._tmp.name, "annotations.journal"))
+        journal.append("a.jpg", {"description": "edited", "labels": []}, 1)
+        journal.append("new.jpg", {"description": "", "labels": ["dog"]}, 1)
+        journal.close()
+        current = list(export.iter_current_annotations(self.meta_file))
+        self.assertEqual([name for name, _ in current], ["a.jpg", "b.jpg", "ç/ü.jpg", "new.jpg"])
+        self.assertEqual(current[0][1]["description"], "edited")
+        self.assertEqual(current[3][1]["labels"], ["dog"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import folder_scan  # noqa: E402
+from folder_scan import MANIFEST_NAME, refresh_folder_mtime, scan_images  # noqa: E402
+
+
+def _write(path, data, mtime=None):
+    with open(path, 'wb') as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _bump_dir_mtime(path):
+    """Make sure the directory's mtime_ns differs from the one recorded (coarse timestamps)."""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+class ScanManifestTest(unittest.TestCase):
+    """scan_images with a manifest: unchanged directories are not listed again, changed ones are"""
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.manifest = os.path.join(self.folder, MANIFEST_NAME)
+        _write(os.path.join(self.folder, "b.jpg"), b"bb", mtime=2000)
+        _write(os.path.join(self.folder, "a.jpg"), b"a", mtime=1000)
+        _write(os.path.join(self.folder, "notes.txt"), b"not an image")
+        _write(os.path.join(self.folder, ".hidden.jpg"), b"hidden")
+        # Count directory listings to tell warm from cold scans
+        self.listed = []
+        real_scan_dir = folder_scan.scan_dir
+
+        def counting_scan_dir(path, recursive):
+            self.listed.append(path)
+            return real_scan_dir(path, recursive)
+        folder_scan.scan_dir = counting_scan_dir
+        self.addCleanup(setattr, folder_scan, "scan_dir", real_scan_dir)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_images_sorted_by_mtime(self):
+        image_files, stats = scan_images(self.folder, manifest_path=self.manifest)
+        self.assertEqual(image_files, ["a.jpg", "b.jpg"])
+        self.assertEqual(stats["b.jpg"], (2, 2000))
+
+    def test_unchanged_folder_is_not_listed_again(self):
+        first = scan_images(self.folder, manifest_path=self.manifest)
+        self.listed.clear()
+        self.assertEqual(scan_images(self.folder, manifest_path=self.manifest), first)
+        self.assertEqual(self.listed, [])
+
+    def test_changed_folder_is_listed_and_restated(self):
+        scan_images(self.folder, manifest_path=self.manifest)
+        # Replaced under the same name (e.g. saved by an editor via a temporary file)
+        _write(os.path.join(self.folder, "tmp"), b"longer", mtime=3000)
+        os.replace(os.path.join(self.folder, "tmp"), os.path.join(self.folder, "a.jpg"))
+        _write(os.path.join(self.folder, "c.jpg"), b"c", mtime=1500)
+        _bump_dir_mtime(self.folder)
+        image_files, stats = scan_images(self.folder, manifest_path=self.manifest)
+        self.assertEqual(image_files, ["c.jpg", "b.jpg", "a.jpg"])
+        self.assertEqual(stats["a.jpg"], (6, 3000))
+
+    def test_recursive_scan_uses_relative_names(self):
+        os.mkdir(os.path.join(self.folder, "sub"))
+        _write(os.path.join(self.folder, "sub", "d.png"), b"d", mtime=500)
+        image_files, _ = scan_images(self.folder, recursive=True, manifest_path=self.manifest)
+        self.assertEqual(image_files, ["sub/d.png", "a.jpg", "b.jpg"])
+        # A manifest written for a non-recursive scan is not reused for a recursive one
+        self.listed.clear()
+        scan_images(self.folder, recursive=False, manifest_path=self.manifest)
+        self.assertEqual(len(self.listed), 1)
+
+    def test_refresh_keeps_warm_start_after_own_writes(self):
+        scan_images(self.folder, manifest_path=self.manifest)
+        _write(os.path.join(self.folder, "annotations.json"), b"{}")
+        _bump_dir_mtime(self.folder)
+        refresh_folder_mtime(self.manifest, self.folder)
+        self.listed.clear()
+        image_files, _ = scan_images(self.folder, manifest_path=self.manifest)
+        self.assertEqual(self.listed, [])
+        self.assertEqual(image_files, ["a.jpg", "b.jpg"])
+
+    def test_refresh_records_images_replaced_during_the_session(self):
+        scan_images(self.folder, manifest_path=self.manifest)
+        _write(os.path.join(self.folder, "tmp"), b"longer", mtime=3000)
+        os.replace(os.path.join(self.folder, "tmp"), os.path.join(self.folder, "a.jpg"))
+        _bump_dir_mtime(self.folder)
+        refresh_folder_mtime(self.manifest, self.folder)
+        _, stats = scan_images(self.folder, manifest_path=self.manifest)
+        self.assertEqual(stats["a.jpg"], (6, 3000))
+
+
+if __name__ == "__main__":
+    unittest.main()
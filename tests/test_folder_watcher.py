@@ -0,0 +1,63 @@
+import os
+import queue
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from folder_watcher import FolderWatcher  # noqa: E402
+
+
+def _touch(path, data=b"x"):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class PollingWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)  # After the watcher has stopped
+        self.folder = self._tmp.name
+        os.mkdir(os.path.join(self.folder, "sub"))
+        for name in ("a.jpg", "b.jpg", "sub/c.jpg"):
+            _touch(os.path.join(self.folder, name))
+        file_stats = {name: (1, 0) for name in ("a.jpg", "b.jpg", "sub/c.jpg")}
+        self.watcher = FolderWatcher(self.folder, file_stats, recursive=True, poll_interval=0.02)
+        # Force the polling fallback, also on Linux
+        self.watcher._inotify_init = mock.Mock(return_value=-1)
+        self.watcher.start()
+        self.addCleanup(self.watcher.stop)
+
+    def next_change(self, timeout=2.0):
+        return self.watcher.changes.get(timeout=timeout)
+
+    def test_reports_added_and_removed_images(self):
+        _touch(os.path.join(self.folder, "new.png"), b"xyz")
+        os.remove(os.path.join(self.folder, "sub/c.jpg"))
+        seen_added, seen_removed = {}, []
+        while "new.png" not in seen_added or "sub/c.jpg" not in seen_removed:
+            added, removed = self.next_change()
+            seen_added.update(added)
+            seen_removed.extend(removed)
+        self.assertEqual(seen_added["new.png"][0], 3)
+        self.assertEqual(set(seen_added), {"new.png"})
+        self.assertEqual(seen_removed, ["sub/c.jpg"])
+
+    def test_new_subdirectory_is_picked_up(self):
+        os.mkdir(os.path.join(self.folder, "later"))
+        _touch(os.path.join(self.folder, "later", "d.jpg"))
+        added = {}
+        while "later/d.jpg" not in added:
+            added.update(self.next_change()[0])
+
+    def test_sidecar_writes_are_not_reported(self):
+        _touch(os.path.join(self.folder, "annotations.json"), b"{}")
+        _touch(os.path.join(self.folder, "notes.txt"))
+        with self.assertRaises(queue.Empty):
+            self.next_change(timeout=0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_store import AnnotationJournal, JsonAnnotationStore, read_annotations_file  # noqa: E402
+
+
+def _entry(description="", labels=()):
+    return {"description": description, "labels": list(labels)}
+
+
+class AnnotationJournalTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.journal = AnnotationJournal(os.path.join(self._tmp.name, "annotations.journal"))
+
+    def tearDown(self):
+        self.journal.close()
+        self._tmp.cleanup()
+
+    def test_replay_skips_a_partial_last_line(self):
+        self.journal.append("a.jpg", _entry("one"), 1)
+        self.journal.append_many([("b.jpg", _entry("two"), 2, None), ("a.jpg", _entry("three"), 2, 5.0)])
+        self.journal.close()
+        with open(self.journal.journal_path, 'a', encoding='utf-8') as f:
+            f.write('{"image": "c.jpg", "annot')  # Crash mid-append
+        self.assertEqual(list(self.journal.replay()), [
+            ("a.jpg", _entry("one"), 1), ("b.jpg", _entry("two"), 2), ("a.jpg", _entry("three"), 2),
+        ])
+        self.assertEqual(self.journal.record_count, 3)
+
+    def test_rotated_records_replay_first_until_discarded(self):
+        self.journal.append("a.jpg", _entry("old"), 1)
+        self.journal.rotate()
+        self.journal.append("a.jpg", _entry("new"), 2)
+        self.assertEqual([a["description"] for _, a, _ in self.journal.replay()], ["old", "new"])
+        self.journal.discard_rotated()
+        self.assertEqual([a["description"] for _, a, _ in self.journal.replay()], ["new"])
+
+    def test_rotate_after_a_failed_compaction_keeps_both(self):
+        self.journal.append("a.jpg", _entry("first"), 1)
+        self.journal.rotate()  # Its snapshot never reached the disk
+        self.journal.append("a.jpg", _entry("second"), 2)
+        self.journal.rotate()
+        self.assertFalse(os.path.exists(self.journal.journal_path))
+        self.assertEqual([a["description"] for _, a, _ in self.journal.replay()], ["first", "second"])
+
+
+class JsonStoreJournalTest(unittest.TestCase):
+    def test_load_replays_and_save_compacts(self):
+        with tempfile.TemporaryDirectory() as folder:
+            meta_file = os.path.join(folder, "annotations.json")
+            with open(meta_file, 'w', encoding='utf-8') as f:
+                json.dump({"last_index": 0, "annotations": {"a.jpg": _entry(), "b.jpg": _entry()}}, f)
+            store = JsonAnnotationStore(folder, save_interval=60)
+            store.load(["a.jpg", "b.jpg"])
+            store.put("a.jpg", _entry("edited", ["cat"]), 1)
+            store.close(save=False)  # As if the app was killed before the rewrite
+
+            self.assertEqual(read_annotations_file(meta_file)[0]["a.jpg"], _entry())
+            store = JsonAnnotationStore(folder, save_interval=60)
+            store.load(["a.jpg", "b.jpg"])
+            self.assertEqual(store.annotations["a.jpg"], _entry("edited", ["cat"]))
+            self.assertEqual(store.last_index, 1)
+            store.close()
+
+            self.assertFalse(os.path.exists(store.journal.journal_path))
+            self.assertFalse(os.path.exists(store.journal.rotated_path))
+            annotations, last_index = read_annotations_file(meta_file)
+            self.assertEqual(annotations["a.jpg"], _entry("edited", ["cat"]))
+            self.assertEqual(last_index, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+import preview_cache  # noqa: E402
+from preview_cache import PreviewCache, _warm_chunk  # noqa: E402
+
+
+class PreviewCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.cache_args = (self.folder, (640, 480), 32)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _image(self, name, size):
+        path = os.path.join(self.folder, name)
+        # Noise: any lossy recompression would change some pixels
+        Image.effect_noise(size, 64).convert("RGB").save(path)
+        return path
+
+    def test_full_resolution_entry_is_lossless(self):
+        path = self._image("small.png", (64, 48))
+        self.assertEqual(_warm_chunk(self.cache_args, [path]), (1, 0))
+        decoded = PreviewCache(*self.cache_args).load_preview(path, (640, 480))
+        self.assertEqual(decoded.full_size, (64, 48))
+        with Image.open(path) as original:
+            self.assertEqual(decoded.image.tobytes(), original.convert("RGB").tobytes())
+
+    def test_reduced_entry_is_not_full_resolution(self):
+        path = self._image("big.png", (2000, 1500))
+        _warm_chunk(self.cache_args, [path])
+        decoded = PreviewCache(*self.cache_args).load_preview(path, (640, 480))
+        self.assertEqual(decoded.full_size, (2000, 1500))
+        self.assertLess(decoded.image.width, 2000)  # Zooming in still loads the original
+
+    def test_decoder_errors_only_fail_their_image(self):
+        good = self._image("good.png", (64, 48))
+        bomb = self._image("bomb.png", (300, 300))
+        junk = os.path.join(self.folder, "junk.jpg")
+        with open(junk, 'wb') as f:
+            f.write(b"not an image")
+        old_limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = 300 * 300 // 3  # bomb.png now raises DecompressionBombError
+        try:
+            self.assertEqual(_warm_chunk(self.cache_args, [bomb, junk, good]), (1, 2))
+        finally:
+            Image.MAX_IMAGE_PIXELS = old_limit
+
+    def test_progress_counts_images_not_chunks(self):
+        paths = [self._image(f"{i}.png", (16, 16)) for i in range(preview_cache._CHUNK + 3)]
+        reported = []
+        result = preview_cache.warm_cache(PreviewCache(*self.cache_args), paths, 2,
+                                          progress=lambda done, total: reported.append((done, total)))
+        self.assertEqual(result["decoded"], len(paths))
+        self.assertEqual(reported[-1], (len(paths), len(paths)))
+        # One report per chunk, whichever of the two finishes first
+        self.assertIn([done for done, _ in reported], ([0, 3, len(paths)], [0, preview_cache._CHUNK, len(paths)]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reconcile  # noqa: E402
+from annotation_store import read_annotations_file  # noqa: E402
+
+
+class ReconcileTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self._tmp.name, "images")
+        os.mkdir(self.folder)
+        for name in ("a.jpg", "b.jpg", "new.jpg"):
+            with open(os.path.join(self.folder, name), 'wb') as f:
+                f.write(b"x")
+        with open(os.path.join(self.folder, "annotations.json"), 'w', encoding='utf-8') as f:
+            json.dump({"last_index": 7, "annotations": {
+                "a.jpg": {"description": "", "labels": ["cat", "old"], "reviewer": "alice"},
+                "b.jpg": {"description": "fine", "labels": ["cat"]},
+                "gone.jpg": {"description": "", "labels": []},
+            }}, f)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def run_reconcile(self, label_groups, *args):
+        config = os.path.join(self._tmp.name, "data_config.json")
+        with open(config, 'w', encoding='utf-8') as f:
+            json.dump({"folder_path": self.folder, "label_groups": label_groups}, f)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            status = reconcile.main(["--config", config, *args])
+        return status, out.getvalue()
+
+    def saved(self):
+        return read_annotations_file(os.path.join(self.folder, "annotations.json"))
+
+    def test_dry_run_reports_and_writes_nothing(self):
+        before = {name: os.stat(os.path.join(self.folder, name)).st_mtime_ns for name in os.listdir(self.folder)}
+        status, out = self.run_reconcile([["cat", "dog"]])
+        self.assertEqual(status, 1)
+        self.assertIn("orphans=1, missing=1, unknown_labels=1, last_index=1", out)
+        after = {name: os.stat(os.path.join(self.folder, name)).st_mtime_ns for name in os.listdir(self.folder)}
+        self.assertEqual(after, before)
+
+    def test_fix_keeps_other_keys(self):
+        status, _ = self.run_reconcile([["cat", "dog"]], "--fix")
+        self.assertEqual(status, 0)
+        annotations, last_index = self.saved()
+        self.assertEqual(annotations["a.jpg"], {"description": "", "labels": ["cat"], "reviewer": "alice"})
+        self.assertEqual(annotations["new.jpg"], {"description": "", "labels": []})
+        self.assertNotIn("gone.jpg", annotations)
+        self.assertEqual(last_index, 2)
+
+    def test_no_label_groups_leaves_labels_alone(self):
+        status, out = self.run_reconcile([], "--fix")
+        self.assertEqual(status, 0)
+        self.assertIn("unknown_labels=0", out)
+        self.assertEqual(self.saved()[0]["a.jpg"]["labels"], ["cat", "old"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_store import AsyncSaveWriter  # noqa: E402
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class AsyncSaveWriterTest(unittest.TestCase):
+    def test_burst_of_requests_is_one_save(self):
+        saves = []
+        writer = AsyncSaveWriter(lambda: saves.append(time.monotonic()), interval=0.05)
+        try:
+            for _ in range(20):
+                writer.request()
+            self.assertTrue(_wait_for(lambda: saves))
+            time.sleep(0.15)
+            self.assertEqual(len(saves), 1)
+            writer.request()
+            self.assertTrue(_wait_for(lambda: len(saves) == 2))
+        finally:
+            writer.close()
+
+    def test_close_does_not_save(self):
+        saves = []
+        writer = AsyncSaveWriter(lambda: saves.append(1), interval=10)
+        writer.request()
+        writer.close()  # The owner does the final save itself
+        self.assertEqual(saves, [])
+        writer.request()  # After close: no new thread
+        self.assertEqual(saves, [])
+
+    def test_failed_save_is_recorded_and_retried(self):
+        attempts = []
+        ok = threading.Event()
+
+        def save():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OSError(28, "No space left on device")
+            if len(attempts) == 2:
+                raise TypeError("not JSON serializable")
+            ok.set()
+
+        writer = AsyncSaveWriter(save, interval=0.02)
+        try:
+            writer.request()
+            self.assertTrue(_wait_for(lambda: writer.last_error is not None))
+            self.assertIsInstance(writer.last_error, OSError)
+            # Any exception keeps the thread alive and the changes pending
+            self.assertTrue(ok.wait(2.0))
+            self.assertEqual(len(attempts), 3)
+            self.assertTrue(_wait_for(lambda: writer.last_error is None))
+        finally:
+            writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
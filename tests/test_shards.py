@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_store import AnnotationJournal, JsonAnnotationStore  # noqa: E402
+from shards import ShardedAnnotationStore, ShardSpec, merge_shards, shard_file  # noqa: E402
+
+
+def _entry(description="", labels=()):
+    return {"description": description, "labels": list(labels)}
+
+
+class ShardMergeTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.canonical = os.path.join(self.folder, "annotations.json")
+        with open(self.canonical, 'w', encoding='utf-8') as f:
+            json.dump({"last_index": 1, "annotations": {
+                "a.jpg": _entry(), "b.jpg": _entry(), "c.jpg": _entry("base"), "d.jpg": _entry(),
+            }}, f)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write_shard(self, annotator, annotations, changed):
+        with open(shard_file(self.folder, annotator), 'w', encoding='utf-8') as f:
+            json.dump({"shard": {"annotator": annotator}, "last_index": 0,
+                       "annotations": annotations, "changed": changed}, f)
+
+    def load_canonical(self):
+        store = JsonAnnotationStore(self.folder)
+        store.load([])
+        store.close(save=False)
+        return dict(store.annotations.items()), store.last_index
+
+    def test_latest_change_wins_and_ties_go_to_the_first_annotator(self):
+        self.write_shard("bob", {"a.jpg": _entry("bob", ["cat"]), "b.jpg": _entry("bob")},
+                         {"a.jpg": 200, "b.jpg": 100})
+        self.write_shard("alice", {"a.jpg": _entry("alice"), "b.jpg": _entry("alice"), "d.jpg": _entry("", ["dog"])},
+                         {"a.jpg": 100, "b.jpg": 100, "d.jpg": 50})
+        result = merge_shards(self.folder)
+        self.assertEqual(result["shards"], 2)
+        self.assertEqual(result["merged"], 3)
+        self.assertEqual(sorted(result["conflicts"]), [("a.jpg", "bob", ["alice"]), ("b.jpg", "alice", ["bob"])])
+        annotations, _ = self.load_canonical()
+        self.assertEqual(annotations["a.jpg"], _entry("bob", ["cat"]))
+        self.assertEqual(annotations["b.jpg"], _entry("alice"))
+        self.assertEqual(annotations["c.jpg"], _entry("base"))
+        self.assertEqual(annotations["d.jpg"], _entry("", ["dog"]))
+
+    def test_dry_run_writes_nothing(self):
+        self.write_shard("alice", {"a.jpg": _entry("alice")}, {"a.jpg": 1})
+        with open(self.canonical, 'rb') as f:
+            before = f.read()
+        self.assertEqual(merge_shards(self.folder, write=False)["merged"], 1)
+        with open(self.canonical, 'rb') as f:
+            self.assertEqual(f.read(), before)
+
+    def test_canonical_journal_is_folded_in_and_compacted(self):
+        journal = AnnotationJournal(os.path.join(self.folder, "annotations.journal"))
+        journal.append("c.jpg", _entry("journal"), 3)
+        journal.append("a.jpg", _entry("journal"), 3)
+        journal.close()
+        self.write_shard("alice", {"a.jpg": _entry("alice")}, {"a.jpg": 1})
+        merge_shards(self.folder)
+        self.assertFalse(os.path.exists(journal.journal_path))
+        self.assertFalse(os.path.exists(journal.rotated_path))
+        annotations, last_index = self.load_canonical()
+        self.assertEqual(annotations["a.jpg"], _entry("alice"))  # Shards take precedence over the canonical entries
+        self.assertEqual(annotations["c.jpg"], _entry("journal"))
+        self.assertEqual(last_index, 3)
+
+
+class ShardedStoreTest(unittest.TestCase):
+    def test_only_changes_are_journaled_and_saved(self):
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "annotations.json"), 'w', encoding='utf-8') as f:
+                json.dump({"last_index": 0, "annotations": {"a.jpg": _entry("", ["cat", "dog"]), "b.jpg": _entry()}}, f)
+            store = ShardedAnnotationStore(folder, ShardSpec("alice"))
+            store.load(["a.jpg", "b.jpg"])
+            store.put("a.jpg", _entry("", ["cat", "dog"]), 0)  # Re-saved unchanged
+            self.assertFalse(os.path.exists(os.path.join(folder, "annotations.alice.journal")))
+            store.put("b.jpg", _entry("mine"), 1)
+            store.close()
+            with open(shard_file(folder, "alice"), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            self.assertEqual(saved["annotations"], {"b.jpg": _entry("mine")})
+            self.assertEqual(set(saved["changed"]), {"b.jpg"})
+            self.assertEqual(saved["last_index"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
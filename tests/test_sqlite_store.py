@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_index import UNDESCRIBED, UNLABELED, AnnotationIndex, label_filter  # noqa: E402
+from sqlite_store import SqliteAnnotationStore  # noqa: E402
+
+
+class SqliteIndexTest(unittest.TestCase):
+    """AnnotationIndex built from the sqlite label/annotated queries matches the one built from a dict"""
+    def test_rebuild_from_queries_matches_dict_rebuild(self):
+        annotations = {
+            "a.jpg": {"description": "", "labels": []},
+            "b.jpg": {"description": "", "labels": ["cat", "dog"]},
+            "c.jpg": {"description": "two cats", "labels": ["cat"]},
+            "d.jpg": {"description": "nothing", "labels": []},
+            "gone.jpg": {"description": "", "labels": ["dog"]},  # No longer in the folder
+        }
+        image_files = ["d.jpg", "c.jpg", "new.jpg", "b.jpg", "a.jpg"]  # new.jpg has no row yet
+        with tempfile.TemporaryDirectory() as folder:
+            store = SqliteAnnotationStore(folder)
+            try:
+                store.annotations.update_many(annotations.items())
+                from_queries = AnnotationIndex()
+                from_queries.rebuild(image_files, store.annotations)
+            finally:
+                store.close(save=False)
+        from_dict = AnnotationIndex()
+        from_dict.rebuild(image_files, annotations)
+
+        for filter_key in (UNLABELED, UNDESCRIBED, label_filter("cat"), label_filter("dog")):
+            self.assertEqual(from_queries.positions(filter_key), from_dict.positions(filter_key), filter_key)
+        self.assertEqual(from_queries.positions(label_filter("dog")), [3])
+        self.assertEqual(from_queries.positions(UNDESCRIBED), [2, 3, 4])
+
+    def test_read_only_store_does_not_create_a_database(self):
+        with tempfile.TemporaryDirectory() as folder:
+            with self.assertRaises(FileNotFoundError):
+                SqliteAnnotationStore(folder, read_only=True)
+            self.assertEqual(os.listdir(folder), [])
+
+
+if __name__ == "__main__":
+    unittest.main()